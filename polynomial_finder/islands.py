@@ -0,0 +1,212 @@
+"""Island model: several populations (islands) evolve in parallel, each one in
+its own process. Every --migration-interval generations, each island sends
+copies of its best candidates to other islands, where they replace the worst
+candidates. The islands only exchange a few candidates, so each one keeps
+exploring its own part of the search space while the good solutions spread.
+
+The migrants go through a block of shared memory holding the best candidates
+of every island and their fitness. The islands wait for each other at every
+migration, so they all run the same number of generations, and they all stop
+at the first migration after one of them reached the target fitness. Launch it
+from this folder, for instance:
+
+    python islands.py --islands 8 --migration-interval 10 --topology ring
+
+Topologies: at each migration, an island receives the migrants of
+- ring: the previous island
+- fully_connected: every other island
+- random: another island, picked at random"""
+
+import os
+import sys
+import queue
+import argparse
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+import polynomial_finder
+from polynomial_finder import Population_buffers, get_initial_population, assess_generation, create_next_generation
+
+TOPOLOGIES = ("ring", "fully_connected", "random")
+
+
+def get_source_islands(topology, island, islands_nbr):
+
+    """Returns the islands whose migrants this island receives"""
+
+    if islands_nbr == 1: return []
+
+    if topology == "ring":
+        return [(island - 1) % islands_nbr]
+    elif topology == "fully_connected":
+        return [i for i in range(islands_nbr) if i != island]
+    else:
+        source = int(polynomial_finder.rng.integers(islands_nbr - 1))
+        return [source + (source >= island)]
+
+
+def send_migrants(population, candidates_fitness, migrants, island):
+
+    """Copies the best candidates of the island, and their fitness, to its part
+    of the shared memory"""
+
+    migrants_nbr = migrants.shape[1]
+    best = np.argpartition(candidates_fitness, migrants_nbr-1)[:migrants_nbr]
+    migrants[island, :, :-1] = population[best]
+    migrants[island, :, -1] = candidates_fitness[best]
+
+
+def receive_migrants(population, candidates_fitness, migrants, source_islands):
+
+    """Replaces the worst candidates of the island by the migrants of
+    source_islands. Their fitness is copied as well, so that they take part in
+    the selection of the next generation"""
+
+    incoming = migrants[source_islands].reshape(-1, migrants.shape[2])
+    if len(incoming) == 0: return
+
+    worst = np.argpartition(candidates_fitness, -len(incoming))[-len(incoming):]
+    population[worst] = incoming[:, :-1]
+    candidates_fitness[worst] = incoming[:, -1]
+
+
+def evolve_island(island, settings, memory_names, barrier, results, seed):
+
+    """Runs an island, in a worker process. At the end, puts (island, best
+    candidate, average fitness history, best fitness history) in results"""
+
+    migrants_memory = shared_memory.SharedMemory(name=memory_names[0])
+    stop_flags_memory = shared_memory.SharedMemory(name=memory_names[1])
+    try:
+        migrants = np.ndarray((settings.islands, settings.migrants, polynomial_finder.degrees+2),
+                              buffer=migrants_memory.buf)
+        stop_flags = np.ndarray(settings.islands, dtype=bool, buffer=stop_flags_memory.buf)
+
+        # Every island has its own random numbers
+        polynomial_finder.rng = np.random.default_rng(seed)
+        training_data = np.array(polynomial_finder.load_training_data()).astype(float)
+        population_buffers = Population_buffers(settings.population_size, polynomial_finder.degrees)
+        current_population = get_initial_population(population_buffers)
+
+        generations_fitness_history = []
+        best_candidate_fitness_history = []
+        best_candidate_overall = None
+
+        for generation_nbr in range(1, settings.generations+1):
+            current_best_candidate, candidates_fitness, generation_fitness = assess_generation(current_population, training_data, generation_nbr, verbose=False)
+            generations_fitness_history.append(generation_fitness)
+            if best_candidate_overall is None or best_candidate_overall[-1] > current_best_candidate[-1]:
+                best_candidate_overall = current_best_candidate
+            best_candidate_fitness_history.append(best_candidate_overall[-1])
+
+            if generation_nbr % settings.migration_interval == 0 or generation_nbr == settings.generations:
+                # A single write, so that the lines of the islands don't mix
+                sys.stdout.write("Island " + str(island) + " - generation " + str(generation_nbr) + " - average fitness: " + str(generation_fitness) + " - best candidate fitness: " + str(best_candidate_overall[-1]) + "\n")
+                sys.stdout.flush()
+
+                stop_flags[island] = best_candidate_overall[-1] <= polynomial_finder.target_fitness
+                send_migrants(current_population, candidates_fitness, migrants, island)
+                # Every island has written its migrants
+                barrier.wait()
+                stop = np.any(stop_flags) or generation_nbr == settings.generations
+                if not stop:
+                    receive_migrants(current_population, candidates_fitness, migrants,
+                                     get_source_islands(settings.topology, island, settings.islands))
+                # Every island has read its migrants, they can be overwritten
+                barrier.wait()
+                if stop: break
+
+            current_population = create_next_generation(current_population, candidates_fitness, population_buffers)
+            population_buffers.swap()
+
+        results.put((island, best_candidate_overall, generations_fitness_history, best_candidate_fitness_history))
+    finally:
+        migrants_memory.close()
+        stop_flags_memory.close()
+
+
+def run_islands(settings):
+
+    """Evolves settings.islands populations in parallel. Returns the best
+    candidate of all the islands (its fitness appended), the average fitness
+    history (average of the islands) and the best fitness history"""
+
+    migrants_shape = (settings.islands, settings.migrants, polynomial_finder.degrees+2)
+    migrants_memory = shared_memory.SharedMemory(create=True, size=int(np.prod(migrants_shape))*8)
+    stop_flags_memory = shared_memory.SharedMemory(create=True, size=settings.islands)
+    memory_names = (migrants_memory.name, stop_flags_memory.name)
+
+    barrier = multiprocessing.Barrier(settings.islands)
+    results_queue = multiprocessing.Queue()
+    seeds = np.random.SeedSequence(settings.seed).spawn(settings.islands)
+    processes = [multiprocessing.Process(target=evolve_island, args=(i, settings, memory_names, barrier, results_queue, seeds[i]))
+                 for i in range(settings.islands)]
+
+    try:
+        for p in processes: p.start()
+
+        results = {}
+        while len(results) < settings.islands:
+            try:
+                island, *island_results = results_queue.get(timeout=1)
+                results[island] = island_results
+            except queue.Empty:
+                # If an island failed, the others would wait for it forever
+                if any(p.exitcode not in (None, 0) for p in processes):
+                    barrier.abort()
+                    raise RuntimeError("An island stopped with an error")
+
+        for p in processes: p.join()
+    finally:
+        for p in processes:
+            if p.is_alive(): p.terminate()
+        migrants_memory.close()
+        migrants_memory.unlink()
+        stop_flags_memory.close()
+        stop_flags_memory.unlink()
+
+    best_candidates = [results[i][0] for i in range(settings.islands)]
+    best_candidate_overall = min(best_candidates, key=lambda c: c[-1])
+    # The islands ran the same number of generations
+    generations_fitness_history = np.mean([results[i][1] for i in range(settings.islands)], axis=0)
+    best_candidate_fitness_history = np.min([results[i][2] for i in range(settings.islands)], axis=0)
+
+    return best_candidate_overall, generations_fitness_history, best_candidate_fitness_history
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Evolves several populations in parallel, exchanging their best candidates")
+    parser.add_argument("--islands", type=int, default=os.cpu_count(), help="number of populations (one process each)")
+    parser.add_argument("--population-size", type=int, default=polynomial_finder.population_size,
+                        help="number of candidates of each island")
+    parser.add_argument("--generations", type=int, default=polynomial_finder.generations_nbr,
+                        help="maximum number of generations")
+    parser.add_argument("--migration-interval", type=int, default=10, help="number of generations between migrations")
+    parser.add_argument("--migrants", type=int, default=10, help="number of candidates each island sends at a migration")
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="ring", help="which islands exchange candidates")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random numbers, to reproduce a run")
+    args = parser.parse_args()
+
+    received_nbr = args.migrants * (args.islands - 1 if args.topology == "fully_connected" else 1)
+    if args.islands < 1 or args.migration_interval < 1 or args.migrants < 1:
+        parser.error("--islands, --migration-interval and --migrants must be positive")
+    if received_nbr >= args.population_size // 2:
+        parser.error("the migrants an island receives must be fewer than half of its population")
+
+    best_candidate_overall, generations_fitness_history, best_candidate_fitness_history = run_islands(args)
+
+    testing_data = np.array(polynomial_finder.load_testing_data()).astype(float)
+    best_candidate_overall = np.delete(best_candidate_overall, -1)
+    print("Best candidate overall: ")
+    print(best_candidate_overall)
+    print("Fitness on the testing set: ", str(polynomial_finder.assess_candidates(best_candidate_overall[None], testing_data)[0]))
+    generations_nbr_history = range(1, len(generations_fitness_history)+1)
+    plt.plot(generations_nbr_history, generations_fitness_history)
+    plt.plot(generations_nbr_history, best_candidate_fitness_history)
+    plt.xlabel('Generations')
+    plt.ylabel('Fitness (normalized RMSE)')
+    plt.show()
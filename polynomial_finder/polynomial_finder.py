@@ -1,140 +1,291 @@
-from statistics import mean
-import math
+import os
 import csv
-import random
+import json
+import argparse
 import matplotlib.pyplot as plt
 import numpy as np
 
 
 degrees = 9
+population_size = 1000
+generations_nbr = 1000
+# The search stops once a candidate's normalized RMSE is this low
+target_fitness = 0.001
+# Range of the random coefficients
+coefficients_range = (-1024, 1024)
+# Chance for a child to get one of its coefficients replaced by a random one
+mutation_probability = 0.1
+# The state of the search is saved every checkpoint_interval generations
+checkpoint_interval = 10
+CHECKPOINT_FILE = 'checkpoint.npz'
 
+rng = np.random.default_rng()
 
-def get_initial_population():
 
+class Population_buffers:
 
-    return np.random.uniform(-1024,1024,(1000, degrees+1))
+    """Arrays every generation is written into, allocated once for the whole
+    run: two populations (the current one, and the next one being created from
+    it, swapped at each generation) and the working arrays of the crossover"""
 
+    def __init__(self, population_size, degrees):
 
-def load_training_data():
+        self.current = np.empty((population_size, degrees+1))
+        self.next = np.empty((population_size, degrees+1))
+
+        # Half of the population is selected, and paired into couples
+        self.selected_nbr = population_size//2 - (population_size//2) % 2
+        self.children_nbr = self.selected_nbr//2
+        self.first_parents = np.empty((self.children_nbr, degrees+1))
+        self.second_parents = np.empty((self.children_nbr, degrees+1))
+        self.crossover_mask = np.empty((self.children_nbr, degrees+1), dtype=bool)
+        self.coefficient_indices = np.arange(degrees+1)
+
+    def swap(self):
+
+        self.current, self.next = self.next, self.current
+
+
+def fill_with_random_candidates(candidates):
+
+    """Overwrites candidates with random coefficients, in place"""
+
+    rng.random(out=candidates)
+    candidates *= coefficients_range[1] - coefficients_range[0]
+    candidates += coefficients_range[0]
+
+
+def get_initial_population(buffers):
 
-    training_samples = []
-    with open('training.csv', newline='') as training_csv_file:
+    fill_with_random_candidates(buffers.current)
+    return buffers.current
 
-        csv_reader = csv.reader(training_csv_file, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+
+def load_data(file_name):
+
+    samples = []
+    with open(file_name, newline='') as csv_file:
+
+        csv_reader = csv.reader(csv_file, delimiter=' ', quotechar='|', quoting=csv.QUOTE_MINIMAL)
         for row in csv_reader :
-            training_samples.append(row)
+            samples.append(row)
 
-    return training_samples
+    return samples
 
 
-def calculate_normalized_square_error(predicted_values, actual_values):
+def load_training_data():
 
+    return load_data('training.csv')
 
-    mse = np.square(np.subtract(actual_values[:,1], predicted_values[:,1])).mean()
-    rmse = math.sqrt(mse)
 
+def load_testing_data():
 
-    normalized_rmse = (rmse/(np.amax(actual_values[:,1])-np.amin(actual_values[:,1])))
-    return normalized_rmse
+    return load_data('testing.csv')
+
+
+class Prepared_dataset:
+
+    """Everything the fitness of a candidate needs from a dataset, computed
+    once: the powers of the x values (Vandermonde matrix, one row per point:
+    x^degrees ... x^0), the target y values and their range, used to normalize
+    the RMSE. None of it depends on the candidates, so the same object is used
+    for every generation"""
+
+    def __init__(self, data, degrees):
+
+        self.data = data
+        self.degrees = degrees
+        self.powers = np.vander(data[:,0], degrees+1)
+        self.targets = data[:,1:2]
+        self.normalization_range = np.amax(data[:,1]) - np.amin(data[:,1])
 
-def assess_candidate(candidate, training_data):
+    def matches(self, data, degrees):
 
-    predicted_values = []
-    for i in training_data:
-        prediction = 0
-        for j in range(len(candidate)):
-            prediction += candidate[j]*math.pow(i[0], len(candidate)-1-j)
-        predicted_values.append([i[0], prediction])
+        """True if this object was prepared from that dataset, for that degree"""
 
-    predicted_values = np.array(predicted_values)
+        if degrees != self.degrees: return False
+        return data is self.data or (data.shape == self.data.shape and np.array_equal(data, self.data))
 
 
-    nrmse = calculate_normalized_square_error(predicted_values, training_data)
+prepared_datasets = []
+
+
+def get_prepared_dataset(data, degrees):
+
+    """Returns the Prepared_dataset of data for that degree. It is only
+    computed again when the dataset or the degree changes"""
+
+    for prepared_dataset in prepared_datasets:
+        if prepared_dataset.matches(data, degrees): return prepared_dataset
+
+    prepared_dataset = Prepared_dataset(data, degrees)
+    # One dataset per file (training and testing) at most
+    prepared_datasets.append(prepared_dataset)
+    del prepared_datasets[:-2]
+    return prepared_dataset
+
+
+def calculate_normalized_square_error(predicted_values, dataset):
+
+    """predicted_values: one column of predictions per candidate (shape:
+    dataset points, candidates)
+    Returns the normalized RMSE of every candidate"""
+
+    mse = np.square(dataset.targets - predicted_values).mean(axis=0)
+    rmse = np.sqrt(mse)
+
+
+    normalized_rmse = rmse/dataset.normalization_range
+    return normalized_rmse
+
+def assess_candidates(candidates, data):
+
+    """Scores the whole population at once. Each candidate holds the
+    coefficients of a polynomial, highest degree first, so the predictions for
+    all the candidates are the product of the powers of the x values by the
+    coefficients (see Prepared_dataset)"""
+
+    dataset = get_prepared_dataset(data, candidates.shape[1]-1)
+    predicted_values = dataset.powers @ candidates.T
+
+    nrmse = calculate_normalized_square_error(predicted_values, dataset)
     return nrmse
 
 
-def assess_generation(generation, training_data, generation_nbr):
+def assess_generation(generation, training_data, generation_nbr, verbose=True):
+
+    """Returns the best candidate (its fitness appended), the fitness of every
+    candidate and the average fitness of the generation. If verbose, they are
+    printed"""
+
+    candidates_fitness = assess_candidates(generation, training_data)
+
+    generation_mean_fitness = candidates_fitness.mean()
+    best_index = np.argmin(candidates_fitness)
+    best_candidate = np.append(generation[best_index], candidates_fitness[best_index])
 
-    candidates_fitness = []
 
 
-    for candidate in generation:
+    if verbose: print("Training with generation ", str(generation_nbr), " - average fitness: ", str(generation_mean_fitness), " - best candidate fitness: ", str(best_candidate[-1]))
+    return (best_candidate, candidates_fitness, generation_mean_fitness)
 
-        candidates_fitness.append(assess_candidate(candidate, training_data))
+def create_next_generation(current_generation, candidates_fitness, buffers):
 
-    generation_mean_fitness = mean(candidates_fitness)
-    candidates_fitness = np.array(candidates_fitness)
-    candidates_fitness = np.reshape(candidates_fitness, (-1, 1))
-    generation = np.append(generation, candidates_fitness, axis = 1)
+    """Writes the next generation into buffers.next, and returns it. The best
+    half of the current generation is paired into random couples, each couple
+    giving a child through a one-point crossover (and sometimes a mutation).
+    The rest of the next generation is made of random candidates. Every
+    operation is done on all the couples at once"""
 
-    ind = np.argsort(generation[:,-1])
-    sorted_array = generation[ind]
-    best_candidate = sorted_array[0]
+    # Best half, in no particular order: no need to sort it
+    selected = np.argpartition(candidates_fitness, buffers.selected_nbr-1)[:buffers.selected_nbr]
+    rng.shuffle(selected)
+    np.take(current_generation, selected[0::2], axis=0, out=buffers.first_parents)
+    np.take(current_generation, selected[1::2], axis=0, out=buffers.second_parents)
 
+    # The coefficients before the splitting point of a couple come from the
+    # first parent, the others from the second one
+    random_candidates_nbr = len(current_generation) - buffers.children_nbr
+    children = buffers.next[random_candidates_nbr:]
+    splitting_points = rng.integers(1, degrees, endpoint=True, size=buffers.children_nbr)
+    np.less(buffers.coefficient_indices, splitting_points[:,None], out=buffers.crossover_mask)
+    np.copyto(children, buffers.second_parents)
+    np.copyto(children, buffers.first_parents, where=buffers.crossover_mask)
 
+    mutated_children = np.flatnonzero(rng.random(buffers.children_nbr) < mutation_probability)
+    mutated_coefficients = rng.integers(0, degrees+1, size=len(mutated_children))
+    children[mutated_children, mutated_coefficients] = rng.uniform(*coefficients_range, size=len(mutated_children))
 
-    print("Training with generation ", str(generation_nbr), " - average fitness: ", str(generation_mean_fitness), " - best candidate fitness: ", str(best_candidate[-1]))
-    return (best_candidate, generation, generation_mean_fitness)
+    fill_with_random_candidates(buffers.next[:random_candidates_nbr])
 
-def create_next_generation(current_generation):
+    return buffers.next
 
-    ind = np.argsort(current_generation[:,-1])
 
-    sorted_array = current_generation[ind]
-    best_candidates = np.array_split(sorted_array, 2)[0]
-    best_candidates = np.delete(best_candidates, -1, 1)
-    np.random.shuffle(best_candidates)
 
-    couples_nbr = len(best_candidates)//2
-    couples = np.split(best_candidates, couples_nbr)
+def save_checkpoint(path, generation_nbr, population, generations_fitness_history, best_candidate_fitness_history, best_candidate_overall):
 
-    children = []
+    """Saves everything needed to continue the search from generation_nbr:
+    the population about to be assessed, the histories, the best candidate so
+    far and the state of the random numbers. Written in a temporary file first,
+    so that an interruption can't leave a half-written checkpoint"""
 
-    for c in couples:
+    temporary_path = path + '.tmp.npz'
+    np.savez(temporary_path, generation_nbr=generation_nbr, population=population,
+             generations_fitness_history=generations_fitness_history,
+             best_candidate_fitness_history=best_candidate_fitness_history,
+             best_candidate_overall=best_candidate_overall,
+             rng_state=json.dumps(rng.bit_generator.state))
+    os.replace(temporary_path, path)
 
-        splitting_point = random.randint(1, degrees)
-        child = np.concatenate((c[0][:splitting_point], c[1][splitting_point:]))
-        mutation_factor = random.randint(1, 10)
-        if mutation_factor==1:
-            child[random.randint(0, len(child)-1)] = random.uniform(-1024,1024)
-        children.append(child)
 
-    new_generation = np.random.uniform(-1024,1024,(750, degrees+1))
+def load_checkpoint(path, buffers):
 
-    new_generation = np.concatenate((new_generation, children), axis=0)
+    """Restores a checkpoint written by save_checkpoint: the population is
+    copied into buffers.current and the random numbers continue where they
+    stopped. Returns (generation_nbr, population, generations_fitness_history,
+    best_candidate_fitness_history, best_candidate_overall)"""
 
-    return new_generation
+    with np.load(path) as checkpoint:
+        if checkpoint["population"].shape != buffers.current.shape:
+            raise ValueError("The checkpoint was saved with another population size or degree")
 
+        buffers.current[:] = checkpoint["population"]
+        rng.bit_generator.state = json.loads(str(checkpoint["rng_state"]))
+        return (int(checkpoint["generation_nbr"]), buffers.current,
+                checkpoint["generations_fitness_history"].tolist(),
+                checkpoint["best_candidate_fitness_history"].tolist(),
+                checkpoint["best_candidate_overall"])
 
 
-current_population = get_initial_population()
-training_data = np.array(load_training_data()).astype(np.float)
-testing_data = np.array(load_testing_data()).astype(np.float)
+if __name__ == "__main__":
 
-generation_nbr = 1
-generations_nbr_history = []
-generations_fitness_history = []
-best_candidate_fitness_history = []
-current_best_candidate = 0
-best_candidate_overall = 0
+    parser = argparse.ArgumentParser(description="Evolves a population of polynomials approximating the training data")
+    parser.add_argument("--resume", action="store_true", help="continue the search saved in the checkpoint file")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="file the state of the search is saved to")
+    parser.add_argument("--checkpoint-interval", type=int, default=checkpoint_interval,
+                        help="number of generations between checkpoints (0: no checkpoints)")
+    args = parser.parse_args()
 
-while generation_nbr<=1000 :
-    generations_nbr_history.append(generation_nbr)
-    current_best_candidate, tested_generation, generation_fitness = assess_generation(current_population, training_data, generation_nbr)
-    generations_fitness_history.append(generation_fitness)
-    if (type(best_candidate_overall) != np.array) or (best_candidate_overall[-1] > current_best_candidate[-1]):
-        best_candidate_overall = current_best_candidate
+    population_buffers = Population_buffers(population_size, degrees)
+    training_data = np.array(load_training_data()).astype(float)
+    testing_data = np.array(load_testing_data()).astype(float)
 
-    best_candidate_fitness_history.append(best_candidate_overall[-1])
-    if best_candidate_overall[-1] <= 0.001: break
-    current_population = create_next_generation(tested_generation)
-    generation_nbr+=1
+    if args.resume:
+        generation_nbr, current_population, generations_fitness_history, best_candidate_fitness_history, best_candidate_overall = load_checkpoint(args.checkpoint, population_buffers)
+        print("Resuming from generation ", str(generation_nbr))
+    else:
+        current_population = get_initial_population(population_buffers)
+        generation_nbr = 1
+        generations_fitness_history = []
+        best_candidate_fitness_history = []
+        best_candidate_overall = None
+    generations_nbr_history = list(range(1, generation_nbr))
+    current_best_candidate = None
+
+    while generation_nbr<=generations_nbr :
+        generations_nbr_history.append(generation_nbr)
+        current_best_candidate, candidates_fitness, generation_fitness = assess_generation(current_population, training_data, generation_nbr)
+        generations_fitness_history.append(generation_fitness)
+        if (best_candidate_overall is None) or (best_candidate_overall[-1] > current_best_candidate[-1]):
+            best_candidate_overall = current_best_candidate
+
+        best_candidate_fitness_history.append(best_candidate_overall[-1])
+        if best_candidate_overall[-1] <= target_fitness: break
+        current_population = create_next_generation(current_population, candidates_fitness, population_buffers)
+        population_buffers.swap()
+        generation_nbr+=1
+
+        if args.checkpoint_interval and (generation_nbr-1) % args.checkpoint_interval == 0:
+            save_checkpoint(args.checkpoint, generation_nbr, current_population, generations_fitness_history,
+                            best_candidate_fitness_history, best_candidate_overall)
+
+    best_candidate_overall = np.delete(best_candidate_overall, -1)
+    print("Best candidate overall: ")
+    print(best_candidate_overall)
+    print("Fitness on the testing set: ", str(assess_candidates(best_candidate_overall[None], testing_data)[0]))
+    plt.plot(generations_nbr_history, generations_fitness_history)
+    plt.plot(generations_nbr_history, best_candidate_fitness_history)
+    plt.xlabel('Generations')
+    plt.ylabel('Fitness (normalized RMSE)')
+    plt.show()
 
-best_candidate_overall = np.delete(best_candidate_overall, -1)
-print("Best candidate overall: ")
-print(best_candidate_overall)
-plt.plot(generations_nbr_history, generations_fitness_history)
-plt.plot(generations_nbr_history, best_candidate_fitness_history)
-plt.xlabel('Generations')
-plt.ylabel('Fitness (normalized RMSE)')
-plt.show()
@@ -1,17 +1,24 @@
 """Inherits from Player_interface, defines the behaviour of the AI player"""
 
 import random
-import json
 
 import numpy as np
 
 from interfaces import Player_interface
+from model import get_model
+from state_store import encode_state
+from symmetry import candidate_keys, Position
 
 class AI(Player_interface):
 
 
-    def __init__(self):
+    def __init__(self, model=None, opening_book=None):
 
+        """model: Value_model holding the training data (see model.py). Several
+        AIs can share the same one. If None, the AI uses the model of the
+        training data saved on disk, shared by every AI of the process
+        opening_book: moves to play at the beginning of the game, see
+        opening_book.py (None: no book)"""
 
         self.is_AI = True
 
@@ -28,8 +35,20 @@ class AI(Player_interface):
 
 
 
-        self.training_data = self.load_training_data()
+        # Updates learnt from the games that just ended, not merged into the
+        # model yet (see write_training_data)
+        self.pending_deltas = []
+
+        if model is None: model = self.load_training_data()
+        self.model = model
+        self.opening_book = opening_book
+
+        # The current game is kept as the list of the moves played (see
+        # Position in symmetry.py). moves_history only holds the key of each
+        # state the AI played, which is all it needs to learn from the game
+        self.position = None
         self.moves_history = []
+        self.batch_moves_history = {}
 
     def play(self, current_state):
 
@@ -38,78 +57,90 @@ class AI(Player_interface):
         return value: numpy array of the board including the move the AI picked, i.e.
         new state of the board"""
 
-        candidate_moves = []
-        known_moves = []
-        unknown_moves = []
-        best_known_candidate = {}
-        chosen_move = []
-
-        # Appending arrays corresponding to every possible move in a list called
-        # candidate_moves
-        for index, value in np.ndenumerate(current_state):
-
-            if value == 0:
-                possible_move = current_state.copy()
-                possible_move[index] = 1
-                candidate_moves.append(possible_move)
-
-        # Checking if every possible move is already known in the training data or not
-        # The candidate moves are divided into two lists depending on whether or not
-        # they are already known
-        for c in candidate_moves:
-            move_is_known = False
-            for s in self.training_data:
-                if np.array_equal(c, s["array"]):
-                    # The value of a state represents how likely it is to make the
-                    # AI win
-                    known_moves.append({"array": s["array"], "value": s["value"]})
-                    move_is_known = True
-                    break
-            #If the move is unknown, there is no known value
-            if not move_is_known: unknown_moves.append(c)
-
-        if not known_moves:
+        # The positions of the opening book are played without any search,
+        # unless the AI is in pure learning mode
+        if self.opening_book is not None and not self.always_explore:
+            book_move = self.opening_book.get(encode_state(current_state))
+            if book_move is not None: return self.play_book_move(current_state, *book_move)
+
+        # The moves played by the opponent since the AI's last move are added to
+        # the position. If the board doesn't follow from it, a new game started
+        if self.position is None or not self.position.follows(current_state):
+            self.position = Position(current_state.shape)
+        self.position.catch_up(current_state)
+
+        # Every empty space is a possible move. The key of the board resulting
+        # from each move is computed directly from the position (see
+        # Position.candidate_keys), so the board is only copied for the move
+        # that is eventually picked
+        candidate_moves, move_keys = self.position.candidate_keys()
+
+        # The value of a state represents how likely it is to make the AI win.
+        # The values of all the candidate moves are looked up at once, NaN
+        # meaning that the move is unknown. Boards equivalent by rotation or
+        # mirroring share the same value, since they share the same key
+        values = self.model.get_values(move_keys)
+        known_moves = np.flatnonzero(~np.isnan(values))
+        unknown_moves = np.flatnonzero(np.isnan(values))
+
+        if known_moves.size == 0:
             # If there is no already known move given the current state, we pick a random unknown move
-            r = random.randint(0, len(unknown_moves)-1)
-            chosen_move = unknown_moves[r]
-            self.moves_history.append(chosen_move)
-            return chosen_move
+            choice = random.choice(unknown_moves.tolist())
 
+        elif self.always_explore:
+            # If we want to explore, we will first try to pick an unknown move.
+            # If there is no unknown move, we randomly pick a move we already know
+            if unknown_moves.size: choice = random.choice(unknown_moves.tolist())
+            else: choice = random.choice(known_moves.tolist())
 
-        if self.always_explore:
-            if unknown_moves != []:
-                # If we want to explore, we will first try to pick an unknown move
-                r = random.randint(0, len(unknown_moves)-1)
-                chosen_move = unknown_moves[r]
-            else:
-                # If there is no unknown move, we randomly pick a move we already know
-                chosen_move = known_moves[random.randint(0, len(known_moves)-1)]["array"]
-            self.moves_history.append(chosen_move)
-            return chosen_move
-
-        # Here we look for the candidate move with the best value among the moves already known
-        for m in known_moves:
-            if best_known_candidate == {} or m["value"] > best_known_candidate["value"]: best_known_candidate = m
-
-        # should_explore(value) finds out whether or not the AI should try new moves
-        # or stick with the best one it already knows, based on the best known candidate
-        # value. See implementation for should_explore for more details
-        if self.should_explore(best_known_candidate["value"]):
-            if unknown_moves != []:
-                r = random.randint(0, len(unknown_moves)-1)
-                chosen_move = unknown_moves[r]
-            else: chosen_move = known_moves[random.randint(0, len(known_moves)-1)]["array"]
         else:
-            chosen_move = best_known_candidate["array"]
+            # Here we look for the candidate move with the best value among the moves already known
+            best_known_candidate = known_moves[np.argmax(values[known_moves])]
+
+            # should_explore(value) finds out whether or not the AI should try new moves
+            # or stick with the best one it already knows, based on the best known candidate
+            # value. See implementation for should_explore for more details
+            if self.should_explore(values[best_known_candidate]):
+                if unknown_moves.size: choice = random.choice(unknown_moves.tolist())
+                else: choice = random.choice(known_moves.tolist())
+            else:
+                choice = best_known_candidate
+
+        return self.make_move(current_state, int(candidate_moves[choice]), move_keys[choice])
+
+    def make_move(self, current_state, space, key=None):
+
+        """Returns a copy of the board where the AI played on space (index in
+        the flattened board), and adds the move to the game's history. key is
+        the canonical key of the new board, if already known"""
+
+        self.position.play(space, 1)
+        if key is None: key = self.position.key()
+        self.moves_history.append(key)
+
+        new_state = current_state.copy()
+        new_state.flat[space] = 1
+        return new_state
+
+
+
+    def play_book_move(self, current_state, space, key):
 
-        self.moves_history.append(chosen_move)
-        return chosen_move
+        """Same as make_move, for a move of the opening book. key is the
+        canonical key of the new board, stored in the book"""
 
+        # The position is rebuilt from the board when the AI leaves the book
+        self.position = None
+        self.moves_history.append(key)
 
+        new_state = current_state.copy()
+        new_state.flat[space] = 1
+        return new_state
 
     def notify_game_result(self, result):
 
 
+        self.position = None
         self.update_training_scores(result)
 
 
@@ -118,109 +149,122 @@ class AI(Player_interface):
         """ At the end of each game, the value for each state is updated
         depending on the game's result"""
 
+        self.learn_from_game(self.moves_history, game_result)
+
+        self.moves_history.clear()
+        self.write_training_data()
+        return
+
+    def learn_from_game(self, moves_history, game_result):
+
+        """Updates the value of every state played in a game.
+        moves_history: canonical keys of these states, in the order they were
+        played"""
+
         # We iterate over the list of all moves played in that game
-        for state_index in range(len(self.moves_history)):
+        for state_index in range(len(moves_history)):
             # The value of a state is calculated in a way that gives more
             # weight to immediate results. Thus a move that makes the AI win
             # immediately will always have a value of 1. However, if the win only occurs after
             # several rounds, the move's value is decreased because of the discount_factor below
 
-            reward_waiting_time = len(self.moves_history) - state_index - 1
-            discount_factor = 1 - reward_waiting_time / len(self.moves_history)
+            reward_waiting_time = len(moves_history) - state_index - 1
+            discount_factor = 1 - reward_waiting_time / len(moves_history)
             state_value = game_result * discount_factor
-            self.update_training_data(self.moves_history[state_index], state_value)
-
-        self.moves_history.clear()
-        self.write_training_data()
-        return
+            self.update_training_data(moves_history[state_index], state_value)
 
-    def should_explore(self, state_value):
+    def play_batch(self, current_states, game_indexes):
 
-        """ Decides whether or not the AI should explore vs playing already known
-        moves. The better the best known move is, the less likely is to try new moves.
-        The exploration rate is a measure of how often the AI will explore. If it is
-        set at 0, the AI will never try new things."""
+        """Same as play, for several games at once (see batch_game_system.py).
+        current_states: array of boards (first dimension: board number)
+        game_indexes: number of the game each board belongs to
+        return value: array of the boards including the moves the AI picked"""
 
-        proba = (1-state_value) * self.exploration_rate
-        random_threshold = random.uniform(0,1)
+        boards_nbr = len(current_states)
+        flat_states = current_states.reshape(boards_nbr, -1)
+        cells_nbr = flat_states.shape[1]
 
-        if random_threshold < proba: return True
+        # Looking up the value of every legal move of every board at once (NaN
+        # if unknown). See candidate_keys for how the keys are computed
+        legal_moves = flat_states == 0
+        board_numbers, spaces, keys = candidate_keys(current_states)
+        values = np.full((boards_nbr, cells_nbr), np.nan)
+        values[board_numbers, spaces] = self.model.get_values(keys)
 
-        return False
+        known_moves = legal_moves & ~np.isnan(values)
+        unknown_moves = legal_moves & np.isnan(values)
 
-    def load_training_data(self):
+        # Same rules as in play: the AI explores when it knows no move, when
+        # always_explore is set, or depending on should_explore's probability.
+        # When exploring, unknown moves are picked first
+        has_known_moves = known_moves.any(axis=1)
+        best_values = np.where(known_moves, values, -np.inf).max(axis=1)
+        explore_probability = (1 - np.where(has_known_moves, best_values, 0)) * self.exploration_rate
+        explore = ~has_known_moves | (np.random.uniform(0, 1, boards_nbr) < explore_probability)
+        if self.always_explore: explore[:] = True
 
-        """ The training data is stored in a JSON file"""
-        training_data = []
+        exploration_pool = np.where(unknown_moves.any(axis=1)[:, None], unknown_moves, known_moves)
+        random_moves = np.where(exploration_pool, np.random.uniform(0, 1, (boards_nbr, cells_nbr)), -1).argmax(axis=1)
+        best_moves = np.where(known_moves, values, -np.inf).argmax(axis=1)
+        chosen_moves = np.where(explore, random_moves, best_moves)
 
-        with open('training.json', 'r+', newline='') as json_file:
+        new_states = current_states.copy()
+        new_states.reshape(boards_nbr, -1)[np.arange(boards_nbr), chosen_moves] = 1
 
-            try:
-                json_data = json.load(json_file)
+        # Only the key of each chosen board is kept (see moves_history)
+        candidate_indexes = np.zeros((boards_nbr, cells_nbr), dtype=np.intp)
+        candidate_indexes[board_numbers, spaces] = np.arange(len(keys))
+        chosen_candidates = candidate_indexes[np.arange(boards_nbr), chosen_moves]
+        for game_index, candidate in zip(game_indexes.tolist(), chosen_candidates.tolist()):
+            self.batch_moves_history.setdefault(game_index, []).append(keys[candidate])
 
-            except json.decoder.JSONDecodeError:
-                return training_data
+        return new_states
 
-        for state in json_data:
+    def notify_batch_results(self, game_indexes, results):
 
-            converted_state = {}
-            flat_array = np.array(state["array"])
-            converted_state["array"] = np.reshape(flat_array, state["dim"])
-            converted_state["value"] = state["value"]
-            converted_state["occurences"] = state["occurences"]
-            training_data.append(converted_state)
+        """Same as notify_game_result, for the games played with play_batch"""
 
-        return training_data
+        for game_index, result in zip(game_indexes.tolist(), results.tolist()):
+            self.learn_from_game(self.batch_moves_history.pop(game_index, []), result)
 
-    def update_training_data(self, state, value):
+        self.write_training_data()
 
-        """ This method updates the current training data based on the result of
-        the last game"""
+    def should_explore(self, state_value):
 
-        new_occurences_number = 0
-        new_state_value = 0
+        """ Decides whether or not the AI should explore vs playing already known
+        moves. The better the best known move is, the less likely is to try new moves.
+        The exploration rate is a measure of how often the AI will explore. If it is
+        set at 0, the AI will never try new things."""
 
-        for state_index in range(len(self.training_data)):
+        proba = (1-state_value) * self.exploration_rate
+        random_threshold = random.uniform(0,1)
 
-            if np.array_equal(self.training_data[state_index]["array"], state):
-                new_occurences_number = self.training_data[state_index]["occurences"]+1
-                new_state_value = (self.training_data[state_index]["value"]*self.training_data[state_index]["occurences"]+value)/(self.training_data[state_index]["occurences"]+1)
-                existing_data_index = state_index
-                break
+        if random_threshold < proba: return True
 
-        if new_occurences_number == 0:
-            new_occurences_number = 1
-            new_state_value = value
-            self.training_data.append({"array": state,
-                                        "value": new_state_value,
-                                        "occurences": new_occurences_number})
-            return
+        return False
 
-        self.training_data[existing_data_index] = {"array": state,
-                                                    "value": new_state_value,
-                                                    "occurences": new_occurences_number}
+    def load_training_data(self):
 
+        """ The training data is stored in a binary snapshot (see persistence.py)
+        followed by a journal of the updates made since (see journal.py). It is
+        only loaded once per process (see model.py)"""
 
+        return get_model()
 
-    def write_training_data(self):
+    def update_training_data(self, key, value):
 
-        """Writes the updated training data in the JSON file"""
-        
-        with open('training.json', 'w', newline='') as json_file:
+        """ This method updates the current training data based on the result of
+        the last game. key: canonical key of the state to update. The update is
+        only kept aside until write_training_data is called"""
 
-            json_global_list = []
+        self.pending_deltas.append((key, value, 1))
 
-            for state in self.training_data:
 
-                json_entry = {}
 
-                flat_array = state["array"].flatten()
-                #json_entry["array"] = np.array2string(flat_array)
-                json_entry["array"] = flat_array.tolist()
-                json_entry["dim"] = state["array"].shape
-                json_entry["value"] = state["value"]
-                json_entry["occurences"] = state["occurences"]
+    def write_training_data(self):
 
-                json_global_list.append(json_entry)
+        """Merges the updates made since the last call into the model, which
+        also saves them if it is stored on disk"""
 
-            json.dump(json_global_list, json_file, indent=4)
+        self.model.merge(self.pending_deltas)
+        self.pending_deltas = []
@@ -0,0 +1,148 @@
+"""Plays many games at once without any display, mostly to train or evaluate
+the AI. All the boards of a batch are stored in a single array (first
+dimension: game number), so that playing moves, converting the boards for the
+players and checking for the end of the games are done with array operations
+over the whole batch instead of game by game.
+
+Both players must implement play_batch() and notify_batch_results() (see
+ai.py)"""
+
+import numpy as np
+
+from interfaces import Game_system_interface
+from game_system import get_winning_lines
+
+# Value of a game's result when it is a draw (otherwise the result is the
+# number of the winner, or 0 while the game is still running)
+DRAW = 3
+
+_lines_cache = {}
+
+
+def get_lines_by_space(board_dimensions, win_length):
+
+    """Returns an array giving, for every space, the winning lines going
+    through it (see get_winning_lines). Spaces crossed by fewer lines than
+    others repeat one of their lines so that the array is rectangular. If the
+    board is too small for anyone to win, there are no lines at all"""
+
+    if (board_dimensions, win_length) not in _lines_cache:
+
+        winning_lines = get_winning_lines(board_dimensions, win_length)
+        lines_by_space = [winning_lines[np.any(winning_lines == space, axis=1)]
+                          for space in range(board_dimensions[0]*board_dimensions[1])]
+        max_lines_nbr = max(len(l) for l in lines_by_space)
+
+        table = np.zeros((len(lines_by_space), max_lines_nbr, win_length), dtype=np.intp)
+        if max_lines_nbr > 0:
+            for space, lines in enumerate(lines_by_space):
+                table[space] = lines[np.arange(max_lines_nbr) % len(lines)]
+
+        _lines_cache[(board_dimensions, win_length)] = table
+
+    return _lines_cache[(board_dimensions, win_length)]
+
+
+def check_for_endgames(boards, winning_lines):
+
+    """Returns an array with the result of each game: 0 if it is still running,
+    1 or 2 if this player won, DRAW if the board is full.
+    winning_lines: either the lines to check on every board (see
+    get_winning_lines), or one set of lines per board (first dimension: board
+    number)"""
+
+    flat_boards = boards.reshape(len(boards), -1)
+    lines = flat_boards[np.arange(len(boards))[:, None, None], winning_lines]
+
+    results = np.zeros(len(boards), dtype=np.int8)
+    results[np.all(flat_boards != 0, axis=1)] = DRAW
+    results[np.any(np.all(lines == 2, axis=2), axis=1)] = 2
+    results[np.any(np.all(lines == 1, axis=2), axis=1)] = 1
+    return results
+
+
+class Batch_game_system(Game_system_interface):
+
+    def __init__(self, player_1, player_2, batch_size=1000, win_length=3):
+
+        self.player_1 = player_1
+        self.player_2 = player_2
+        self.batch_size = batch_size
+        self.win_length = win_length
+
+        self.player_1_scores = {"WINS": 0, "LOSSES": 0, "DRAWS": 0}
+        self.player_2_scores = {"WINS": 0, "LOSSES": 0, "DRAWS": 0}
+
+    def play_a_game(self, board_dimensions=(3,3)):
+
+        return self.play_games(1, board_dimensions)
+
+    def play_games(self, games_nbr, board_dimensions=(3,3)):
+
+        """Plays games_nbr games, batch_size games at a time"""
+
+        for first_game in range(0, games_nbr, self.batch_size):
+            self.play_batch(min(self.batch_size, games_nbr - first_game), board_dimensions)
+
+        return True
+
+    def play_batch(self, games_nbr, board_dimensions):
+
+        """Plays games_nbr games at the same time until they are all over"""
+
+        # Only the lines going through the last move of a game can have been
+        # completed, so these are the only ones checked
+        lines_by_space = get_lines_by_space(tuple(board_dimensions), self.win_length)
+        last_spaces = np.zeros(games_nbr, dtype=np.intp)
+        boards = np.zeros((games_nbr,) + tuple(board_dimensions), dtype=np.int8)
+        # The boards as each player sees them, updated at every move like in
+        # Game_system (see Game_system.convert_board_for_player)
+        player_boards = {1: np.zeros((games_nbr, boards[0].size), dtype=np.int8),
+                         2: np.zeros((games_nbr, boards[0].size), dtype=np.int8)}
+        flat_boards = boards.reshape(games_nbr, -1)
+        turns = np.random.randint(1, 3, games_nbr)
+        results = np.zeros(games_nbr, dtype=np.int8)
+
+        running = np.ones(games_nbr, dtype=bool)
+        while running.any():
+
+            for player_nbr, player in ((1, self.player_1), (2, self.player_2)):
+
+                playing = np.flatnonzero(running & (turns == player_nbr))
+                if playing.size == 0: continue
+
+                # Only the move played on each board is needed to update the
+                # boards, for every board at once
+                player_view = player_boards[player_nbr][playing]
+                new_boards = player.play_batch(player_view.reshape((playing.size,) + tuple(board_dimensions)), playing)
+                moves = np.argmax(new_boards.reshape(playing.size, -1) != player_view, axis=1)
+                last_spaces[playing] = moves
+                flat_boards[playing, moves] = player_nbr
+                player_boards[player_nbr][playing, moves] = 1
+                player_boards[3 - player_nbr][playing, moves] = -1
+
+            turns[running] = 3 - turns[running]
+            results[running] = check_for_endgames(boards[running], lines_by_space[last_spaces[running]])
+            running = results == 0
+
+        self.update_scores(results)
+
+        # Results are given to the players the same way as in Game_system: 1 for
+        # a win, 0 for a loss, 0.5 for a draw
+        player_1_results = np.select([results == 1, results == 2], [1, 0], 0.5)
+        game_indexes = np.arange(games_nbr)
+        self.player_1.notify_batch_results(game_indexes, player_1_results)
+        self.player_2.notify_batch_results(game_indexes, 1 - player_1_results)
+
+    def update_scores(self, results):
+
+        player_1_wins = int(np.count_nonzero(results == 1))
+        player_2_wins = int(np.count_nonzero(results == 2))
+        draws = int(np.count_nonzero(results == DRAW))
+
+        self.player_1_scores["WINS"] += player_1_wins
+        self.player_1_scores["LOSSES"] += player_2_wins
+        self.player_1_scores["DRAWS"] += draws
+        self.player_2_scores["WINS"] += player_2_wins
+        self.player_2_scores["LOSSES"] += player_1_wins
+        self.player_2_scores["DRAWS"] += draws
@@ -0,0 +1,300 @@
+"""Measures how fast the project runs and how well the AI learns, and writes the
+results to a JSON file so that they can be compared from one version to the
+next. Launch it from this folder, for instance:
+
+    python benchmark.py --output benchmark.json
+
+What is measured:
+- the time the AI takes to play a move (percentiles, in microseconds)
+- how many times per second the game systems can check for the end of a game
+  and convert the board for a player
+- how many games per second two AIs play against each other, with a table of
+  1k to 1M states (see --table-sizes)
+- the time the AI takes to save the updates of a game (write_training_data)
+- the learning curve of an AI starting from scratch: its win, draw and loss
+  rates against a random player and against the minimax player (which plays
+  perfectly on a 3x3 board)
+
+The training data of the project is never used: the AIs start from empty or
+padded tables, and every file is written in a temporary folder"""
+
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+
+import persistence
+from ai import AI
+from model import Value_model
+from journal import Journal
+from state_store import State_store
+from game_system import Game_system
+from bitboard_game_system import Bitboard_game_system
+from batch_game_system import Batch_game_system
+from random_player import Random_player
+from minimax_player import Minimax_player
+
+
+class Timed_AI(AI):
+
+    """AI measuring the time every call to write_training_data takes"""
+
+    def __init__(self, model=None):
+
+        AI.__init__(self, model)
+        self.write_durations = []
+
+    def write_training_data(self):
+
+        starting_time = time.perf_counter()
+        AI.write_training_data(self)
+        self.write_durations.append(time.perf_counter() - starting_time)
+
+
+def get_percentiles(durations):
+
+    """Returns the percentiles of a list of durations (seconds), in microseconds"""
+
+    durations = np.array(durations) * 1e6
+    return {"p50": float(np.percentile(durations, 50)),
+            "p90": float(np.percentile(durations, 90)),
+            "p99": float(np.percentile(durations, 99)),
+            "max": float(durations.max()),
+            "mean": float(durations.mean())}
+
+
+def measure_rate(function, calls_nbr):
+
+    """Returns how many times function can be called per second"""
+
+    starting_time = time.perf_counter()
+    for i in range(calls_nbr): function()
+    return calls_nbr / (time.perf_counter() - starting_time)
+
+
+def get_padded_model(states_nbr):
+
+    """Returns a model whose table holds states_nbr states that no real board
+    can match (their first bytes aren't the dimensions of a board), so that only
+    the size of the table changes from one measure to the other"""
+
+    keys = [b'\xff\xff' + i.to_bytes(8, 'little') for i in range(states_nbr)]
+    return Value_model(State_store.from_arrays(keys, np.full(states_nbr, 0.5), np.ones(states_nbr, dtype=np.int64)))
+
+
+def get_random_boards(boards_nbr, board_dimensions):
+
+    """Returns random boards of games in progress, as seen by the player about
+    to play (1: this player, -1: the opponent)"""
+
+    spaces_nbr = board_dimensions[0]*board_dimensions[1]
+    boards = []
+    for i in range(boards_nbr):
+        moves_nbr = random.randint(0, spaces_nbr-1)
+        flat_board = np.zeros(spaces_nbr, dtype=np.int8)
+        # The opponent played last
+        flat_board[np.random.permutation(spaces_nbr)[:moves_nbr]] = [(-1, 1)[(moves_nbr - m) % 2] for m in range(moves_nbr)]
+        boards.append(flat_board.reshape(board_dimensions))
+    return boards
+
+
+def benchmark_play(states_nbr, moves_nbr, board_dimensions):
+
+    ai = AI(get_padded_model(states_nbr))
+    durations = []
+    for board in get_random_boards(moves_nbr, board_dimensions):
+        # Every board is a new game for the AI
+        ai.position = None
+        ai.moves_history.clear()
+
+        starting_time = time.perf_counter()
+        ai.play(board)
+        durations.append(time.perf_counter() - starting_time)
+
+    results = get_percentiles(durations)
+    results["states"] = states_nbr
+    results["moves"] = moves_nbr
+    return results
+
+
+def benchmark_game_systems(calls_nbr, board_dimensions, win_length):
+
+    results = {}
+    for game_system_class in (Game_system, Bitboard_game_system):
+
+        # Half of the board is played, the game still running after the last move
+        game_system = game_system_class(Random_player(), Random_player(), win_length=win_length)
+        while True:
+            game_system.new_board(board_dimensions)
+            spaces = np.random.permutation(game_system.current_board.size)
+            for i, space in enumerate(spaces[:len(spaces)//2].tolist()):
+                move = np.unravel_index(space, board_dimensions)
+                game_system.current_board[move] = 1 + i % 2
+                game_system.record_move(move, 1 + i % 2)
+            if game_system.check_for_endgame() == "CONTINUE": break
+
+        results[game_system_class.__name__] = {
+            "check_for_endgame_per_s": measure_rate(game_system.check_for_endgame, calls_nbr),
+            "convert_board_for_player_per_s": measure_rate(lambda: game_system.convert_board_for_player(2), calls_nbr)}
+
+    return results
+
+
+def benchmark_self_play(table_sizes, games_nbr, board_dimensions, win_length):
+
+    """Games per second between two AIs sharing a table of each size, played
+    one at a time (Game_system) and by batches (Batch_game_system)"""
+
+    results = []
+    for states_nbr in table_sizes:
+
+        model = get_padded_model(states_nbr)
+        game_system = Game_system(AI(model), AI(model), win_length=win_length)
+        games_per_s = measure_rate(lambda: game_system.play_a_game(board_dimensions), games_nbr)
+
+        model = get_padded_model(states_nbr)
+        batch_game_system = Batch_game_system(AI(model), AI(model), 100, win_length)
+        starting_time = time.perf_counter()
+        batch_game_system.play_games(games_nbr, board_dimensions)
+        batch_games_per_s = games_nbr / (time.perf_counter() - starting_time)
+
+        results.append({"states": states_nbr, "games_per_s": games_per_s, "batch_games_per_s": batch_games_per_s})
+        print("  ", states_nbr, "states:", round(games_per_s), "games/s,", round(batch_games_per_s), "games/s by batches")
+
+    return results
+
+
+def benchmark_persistence(games_nbr, board_dimensions, win_length, folder):
+
+    """Time taken to journal the updates of a game, and to write a whole
+    snapshot of the resulting table"""
+
+    journal = Journal(os.path.join(folder, persistence.TRAINING_FILE), os.path.join(folder, 'training.journal'))
+    model = Value_model(State_store(), journal)
+    player_1 = Timed_AI(model)
+    player_2 = Timed_AI(model)
+    game_system = Game_system(player_1, player_2, win_length=win_length)
+    for i in range(games_nbr): game_system.play_a_game(board_dimensions)
+    journal.close()
+
+    results = get_percentiles(player_1.write_durations + player_2.write_durations)
+    results["games"] = games_nbr
+
+    starting_time = time.perf_counter()
+    persistence.save_training_data(model.store, os.path.join(folder, 'snapshot.bin'))
+    results["snapshot_states"] = len(model.store)
+    results["snapshot_save_s"] = time.perf_counter() - starting_time
+    return results
+
+
+def evaluate(model, opponent, games_nbr):
+
+    """Returns the win, draw and loss rates of an AI playing against opponent.
+    The AI always learns from its games, so it plays with a copy of the model.
+    Like in compare_learning.py, the copy never explores: it always plays its
+    best known move"""
+
+    player = AI(Value_model(State_store.from_arrays(*model.store.to_arrays())))
+    player.exploration_rate = 0
+    game_system = Game_system(player, opponent)
+    for i in range(games_nbr): game_system.play_a_game((3,3))
+
+    scores = game_system.player_1_scores
+    return {"wins": scores["WINS"] / games_nbr,
+            "draws": scores["DRAWS"] / games_nbr,
+            "losses": scores["LOSSES"] / games_nbr}
+
+
+def benchmark_learning(games_nbr, interval, evaluation_games):
+
+    """Learning curve of an AI starting from scratch on a 3x3 board, training
+    by playing against itself"""
+
+    model = Value_model(State_store())
+    self_play = Game_system(AI(model), AI(model))
+    opponents = {"random": Random_player(), "minimax": Minimax_player()}
+
+    results = []
+    for games_played in range(interval, games_nbr+1, interval):
+        for i in range(interval): self_play.play_a_game((3,3))
+
+        point = {"games": games_played, "states": len(model)}
+        for name, opponent in opponents.items(): point[name] = evaluate(model, opponent, evaluation_games)
+        results.append(point)
+        print("  ", games_played, "games:", "random", point["random"], "- minimax", point["minimax"])
+
+    return results
+
+
+def get_revision():
+
+    """Returns the commit the benchmark was run on, if known"""
+
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+
+    board_dimensions = tuple(args.board)
+    results = {"revision": get_revision(),
+               "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "python": sys.version.split()[0],
+               "numpy": np.__version__,
+               "platform": platform.platform(),
+               "settings": vars(args)}
+
+    print("AI.play latency")
+    results["play_latency_us"] = benchmark_play(args.table_sizes[-1], args.moves, board_dimensions)
+
+    print("Game systems throughput")
+    results["game_systems"] = benchmark_game_systems(args.calls, board_dimensions, args.win_length)
+
+    print("Self-play")
+    results["self_play"] = benchmark_self_play(args.table_sizes, args.self_play_games, board_dimensions, args.win_length)
+
+    print("write_training_data latency")
+    with tempfile.TemporaryDirectory() as folder:
+        results["write_training_data_us"] = benchmark_persistence(args.self_play_games, board_dimensions,
+                                                                  args.win_length, folder)
+
+    if args.learning_games > 0:
+        print("Learning curve")
+        results["learning_curve"] = benchmark_learning(args.learning_games, args.interval, args.evaluation)
+
+    with open(args.output, 'w') as output_file: json.dump(results, output_file, indent=2)
+    print("Results written to", args.output)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmarks the tic-tac-toe AI and writes the results as JSON")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file the results are written to")
+    parser.add_argument("--board", type=int, nargs=2, default=[3, 3], metavar=("ROWS", "COLUMNS"),
+                        help="dimensions of the board (except for the learning curve, always on 3x3)")
+    parser.add_argument("--win-length", type=int, default=3, help="number of symbols to align to win")
+    parser.add_argument("--table-sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000],
+                        help="number of states in the table for the self-play measures (the largest one is also "
+                             "used for the latency of AI.play)")
+    parser.add_argument("--moves", type=int, default=10000, help="number of moves timed for the latency of AI.play")
+    parser.add_argument("--calls", type=int, default=100000,
+                        help="number of calls timed for the throughput of the game systems")
+    parser.add_argument("--self-play-games", type=int, default=2000,
+                        help="number of games played for each table size, and to time write_training_data")
+    parser.add_argument("--learning-games", type=int, default=20000,
+                        help="number of training games for the learning curve (0 to skip it)")
+    parser.add_argument("--interval", type=int, default=2000, help="number of training games between evaluations")
+    parser.add_argument("--evaluation", type=int, default=200,
+                        help="number of games played against each opponent per evaluation")
+    args = parser.parse_args()
+
+    run(args)
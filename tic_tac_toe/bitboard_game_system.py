@@ -0,0 +1,70 @@
+"""Same game system as Game_system, with a faster way to check for the end of
+the game. On top of current_board (still used by the players and the
+graphics), each player's spaces are stored as the bits of an integer (a
+bitboard): the space (row, column) is the bit number row*columns + column.
+Every line of the board a player can win with is turned into a bitmask once
+per board size, so checking for a win, a draw or for the legal moves only takes
+a few bitwise operations"""
+
+from game_system import Game_system, get_winning_lines
+
+_masks_cache = {}
+
+
+def get_masks(board_dimensions, win_length):
+
+    """Returns the bitmask of a full board, and for every space, the bitmasks
+    of the winning lines going through it"""
+
+    if (board_dimensions, win_length) not in _masks_cache:
+
+        spaces_nbr = board_dimensions[0]*board_dimensions[1]
+        full_board_mask = (1 << spaces_nbr) - 1
+
+        lines_by_space = [[] for i in range(spaces_nbr)]
+        for line in get_winning_lines(board_dimensions, win_length).tolist():
+            line_mask = sum(1 << space for space in line)
+            for space in line: lines_by_space[space].append(line_mask)
+
+        _masks_cache[(board_dimensions, win_length)] = (full_board_mask, lines_by_space)
+
+    return _masks_cache[(board_dimensions, win_length)]
+
+
+class Bitboard_game_system(Game_system):
+
+    def new_board(self, board_dimensions):
+
+        Game_system.new_board(self, board_dimensions)
+
+        # bitboards[1] and bitboards[2] hold the spaces of player 1 and 2
+        self.bitboards = [0, 0, 0]
+        self.full_board_mask, self.lines_by_space = get_masks(tuple(board_dimensions), self.win_length)
+        self.last_space = None
+
+    def record_move(self, move, player_nbr):
+
+        Game_system.record_move(self, move, player_nbr)
+
+        self.last_space = int(move[0])*self.current_board.shape[1] + int(move[1])
+        self.bitboards[player_nbr] |= 1 << self.last_space
+        self.last_player = player_nbr
+
+    def check_for_endgame(self):
+
+        """Only the lines going through the last move can have been completed"""
+
+        if self.last_space is None: return "CONTINUE"
+
+        player_bitboard = self.bitboards[self.last_player]
+        for line_mask in self.lines_by_space[self.last_space]:
+            if player_bitboard & line_mask == line_mask: return self.last_player
+
+        if self.bitboards[1] | self.bitboards[2] == self.full_board_mask: return "DRAW"
+        return "CONTINUE"
+
+    def get_legal_moves(self):
+
+        """Returns the bitmask of the empty spaces"""
+
+        return ~(self.bitboards[1] | self.bitboards[2]) & self.full_board_mask
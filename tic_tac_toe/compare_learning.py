@@ -0,0 +1,104 @@
+"""Compares how fast the AI of ai.py and the TD(lambda) AI of td_ai.py learn.
+Both start from scratch (nothing is read or saved on disk) and train by playing
+against themselves. Every --interval training games, each AI plays --evaluation
+games against a fixed opponent without learning, and its win rate is printed.
+Launch it from this folder:
+
+    python compare_learning.py --games 20000 --opponent random
+
+TD_AI only handles boards of up to 16 spaces (see td_ai.MAX_SPACES), for
+instance:
+
+    python compare_learning.py --board 4 4 --win-length 4 --games 50000
+"""
+
+import argparse
+
+from ai import AI
+from td_ai import TD_AI, new_values
+from model import Value_model
+from state_store import State_store
+from game_system import Game_system
+from random_player import Random_player
+from minimax_player import Minimax_player
+
+
+def evaluate(player, opponent, games_nbr, board_dimensions, win_length):
+
+    """Returns the win and non-loss rates of player against opponent"""
+
+    game_system = Game_system(player, opponent, win_length=win_length)
+    for i in range(games_nbr): game_system.play_a_game(board_dimensions)
+
+    scores = game_system.player_1_scores
+    return scores["WINS"] / games_nbr, (scores["WINS"] + scores["DRAWS"]) / games_nbr
+
+
+def evaluate_tabular_ai(player, opponent, games_nbr, board_dimensions, win_length):
+
+    """The tabular AI always learns from its games, so it is evaluated on a
+    copy of its training data. Like the TD AI, the copy never explores: it
+    always plays its best known move"""
+
+    copy = AI(Value_model(State_store.from_arrays(*player.model.store.to_arrays())))
+    copy.exploration_rate = 0
+    return evaluate(copy, opponent, games_nbr, board_dimensions, win_length)
+
+
+def evaluate_td_ai(player, opponent, games_nbr, board_dimensions, win_length):
+
+    player.learning = False
+    rates = evaluate(player, opponent, games_nbr, board_dimensions, win_length)
+    player.learning = True
+    return rates
+
+
+def compare(games_nbr, interval, evaluation_games, opponent, board_dimensions=(3,3), win_length=3, td_settings={}):
+
+    """td_settings: keyword arguments of TD_AI (learning_rate, trace_decay...)"""
+
+    tabular_ai = AI(Value_model(State_store()))
+    tabular_self_play = Game_system(tabular_ai, AI(tabular_ai.model), win_length=win_length)
+
+    td_ai = TD_AI(board_dimensions, values=new_values(board_dimensions), persistent=False, **td_settings)
+    td_self_play = Game_system(td_ai, TD_AI(board_dimensions, persistent=False, values=td_ai.values, **td_settings),
+                               win_length=win_length)
+
+    print("games - tabular AI wins / non-losses - TD AI wins / non-losses")
+    for games_played in range(interval, games_nbr+1, interval):
+
+        for i in range(interval):
+            tabular_self_play.play_a_game(board_dimensions)
+            td_self_play.play_a_game(board_dimensions)
+
+        tabular_rates = evaluate_tabular_ai(tabular_ai, opponent, evaluation_games, board_dimensions, win_length)
+        td_rates = evaluate_td_ai(td_ai, opponent, evaluation_games, board_dimensions, win_length)
+        print(games_played, "-", "%.3f / %.3f" % tabular_rates, "-", "%.3f / %.3f" % td_rates)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compares how fast the tabular and the TD(lambda) AIs learn")
+    parser.add_argument("--games", type=int, default=20000, help="number of self-play games")
+    parser.add_argument("--interval", type=int, default=1000, help="number of games between evaluations")
+    parser.add_argument("--evaluation", type=int, default=500, help="number of games per evaluation")
+    parser.add_argument("--opponent", choices=("random", "minimax"), default="random",
+                        help="fixed opponent the AIs are evaluated against")
+    parser.add_argument("--board", type=int, nargs=2, default=[3, 3], metavar=("ROWS", "COLUMNS"),
+                        help="dimensions of the board (16 spaces at most)")
+    parser.add_argument("--win-length", type=int, default=3, help="number of symbols to align to win")
+    parser.add_argument("--minimax-time-budget", type=float, default=None,
+                        help="seconds of search per move of the minimax opponent (by default, search until the end "
+                             "of the game: only for 3x3 boards)")
+    parser.add_argument("--learning-rate", type=float, default=0.2, help="alpha of the TD AI")
+    parser.add_argument("--trace-decay", type=float, default=0.8, help="lambda of the TD AI")
+    parser.add_argument("--exploration-decay", type=float, default=0.999,
+                        help="decay of the TD AI's exploration rate after each game")
+    args = parser.parse_args()
+
+    if args.opponent == "random": opponent = Random_player()
+    else: opponent = Minimax_player(args.win_length, time_budget=args.minimax_time_budget)
+
+    td_settings = {"learning_rate": args.learning_rate, "trace_decay": args.trace_decay,
+                   "exploration_decay": args.exploration_decay}
+    compare(args.games, args.interval, args.evaluation, opponent, tuple(args.board), args.win_length, td_settings)
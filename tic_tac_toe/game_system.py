@@ -6,9 +6,36 @@ import numpy as np
 
 from interfaces import Game_system_interface
 
+# Conversion tables from the representation of the board used by the players
+# (-1, 0 and 1) to the central one (0, 1 and 2, see
+# Game_system.convert_board_for_player), indexed by the value + 1
+BOARD_FROM_PLAYER = {1: np.array([2, 0, 1], dtype=np.int8),
+                     2: np.array([1, 0, 2], dtype=np.int8)}
+
+
+def get_winning_lines(board_dimensions, win_length=3):
+
+    """Returns an array with one row per line of win_length spaces on a board
+    with these dimensions (horizontal, vertical and both diagonals). Each row
+    holds the indexes of the line's spaces in the flattened board"""
+
+    rows, columns = board_dimensions
+    indexes = np.arange(rows*columns).reshape(board_dimensions)
+    lines = []
+
+    for direction in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        for row in range(rows):
+            for column in range(columns):
+                last_row = row + direction[0]*(win_length-1)
+                last_column = column + direction[1]*(win_length-1)
+                if 0 <= last_row < rows and 0 <= last_column < columns:
+                    lines.append([indexes[row + direction[0]*i, column + direction[1]*i] for i in range(win_length)])
+
+    return np.array(lines, dtype=np.intp).reshape(-1, win_length)
+
 class Game_system(Game_system_interface):
 
-    def __init__(self, player_1, player_2, graphics=0):
+    def __init__(self, player_1, player_2, graphics=0, win_length=3):
 
         if not graphics:
             self.no_display = True
@@ -22,14 +49,20 @@ class Game_system(Game_system_interface):
         self.player_1_scores = {"WINS": 0, "LOSSES": 0, "DRAWS": 0}
         self.player_2_scores = {"WINS": 0, "LOSSES": 0, "DRAWS": 0}
 
+        # Number of symbols a player has to align to win
+        self.win_length = win_length
+
         self.current_board = []
+        self.player_boards = {}
+        self.last_move = None
+        self.moves_played = 0
         self.turn = 0
 
     def play_a_game(self, board_dimensions=(3,3)):
 
         """ Start a new game """
 
-        self.current_board = np.zeros(board_dimensions, dtype=np.int8)
+        self.new_board(board_dimensions)
         if not self.no_display: self.graphics.update_players_data(self.player_1.is_AI, self.player_1_scores, self.player_2.is_AI, self.player_2_scores)
         self.turn = random.randint(1, 2)
 
@@ -82,8 +115,11 @@ class Game_system(Game_system_interface):
                 # convert_board_for_player for more details
                 board = self.convert_board_for_player(1)
                 new_board = self.player_1.play(board)
-                # The board is then converted back to its central representation
-                self.current_board = self.convert_back_board_from_ai(new_board, 1)
+                # Only the move the AI played is needed to update the central
+                # representation of the board
+                move = self.find_move(new_board)
+                self.current_board[move] = 1
+                self.record_move(move, 1)
                 if not self.no_display:
                     # Telling the graphics to update the display based on the AI move
                     if self.graphics.update_display(self.current_board) == "EXIT": return "EXIT"
@@ -92,6 +128,7 @@ class Game_system(Game_system_interface):
                 if not self.no_display: move = self.graphics.wait_for_move(self.current_board)
                 if move == "EXIT": return "EXIT"
                 self.current_board[move[0], move[1]] = 1
+                self.record_move(move, 1)
             self.turn = 2
 
         elif self.turn == 2:
@@ -101,8 +138,11 @@ class Game_system(Game_system_interface):
                 # convert_board_for_player for more details
                 board = self.convert_board_for_player(2)
                 new_board = self.player_2.play(board)
-                # The board is then converted back to its central representation
-                self.current_board = self.convert_back_board_from_ai(new_board, 2)
+                # Only the move the AI played is needed to update the central
+                # representation of the board
+                move = self.find_move(new_board)
+                self.current_board[move] = 2
+                self.record_move(move, 2)
                 if not self.no_display:
                     # Telling the graphics to update the display based on the AI move
                     if self.graphics.update_display(self.current_board) == "EXIT": return "EXIT"
@@ -112,30 +152,61 @@ class Game_system(Game_system_interface):
                 if not self.no_display: move = self.graphics.wait_for_move(self.current_board)
                 if move == "EXIT": return "EXIT"
                 self.current_board[move[0], move[1]] = 2
+                self.record_move(move, 2)
             self.turn = 1
 
+    def new_board(self, board_dimensions):
+
+        """Creates an empty board for a new game"""
+
+        self.current_board = np.zeros(board_dimensions, dtype=np.int8)
+        # The board as each player sees it (see convert_board_for_player)
+        self.player_boards = {1: np.zeros(board_dimensions, dtype=np.int8),
+                              2: np.zeros(board_dimensions, dtype=np.int8)}
+        self.last_move = None
+        self.moves_played = 0
+
+    def find_move(self, new_board):
+
+        """Returns the (row, column) of the space where a player played, given
+        the board returned by the player"""
+
+        played_space = np.flatnonzero((new_board.ravel() != 0) & (self.current_board.ravel() == 0))[0]
+        return np.unravel_index(played_space, new_board.shape)
+
+    def record_move(self, move, player_nbr):
+
+        """Called after every move, once current_board is up to date"""
+
+        self.player_boards[player_nbr][move[0], move[1]] = 1
+        self.player_boards[3 - player_nbr][move[0], move[1]] = -1
+        self.last_move = move
+        self.moves_played += 1
+
     def check_for_endgame(self):
 
-        """Checks if the game is over, i.e. if a player aligned 3 symbols"""
-        no_space_left = True
-        testing_x = testing_y = range(-1, 2)
-
-        for index, value in np.ndenumerate(self.current_board):
-            if value == 0 :
-                no_space_left = False
-
-            elif (value == 1) or (value == 2):
-                for i in testing_x:
-                    for j in testing_y:
-                        if i == 0 and j == 0: continue
-                        try:
-                            if (self.current_board[index[0]+i, index[1]+j] == value) and (self.current_board[index[0]+2*i, index[1]+2*j] == value):
-                                if index[0]+i >= 0 and index[0]+2*i >= 0 and index[1]+j >= 0 and index[1]+2*j >= 0:
-                                    return value
-                        except IndexError:
-                            continue
-
-        if no_space_left: return "DRAW"
+        """Checks if the game is over, i.e. if a player aligned win_length
+        symbols. Only the lines going through the last move can have been
+        completed, so we count the symbols aligned with it in each direction"""
+
+        if self.last_move is None: return "CONTINUE"
+
+        row, column = int(self.last_move[0]), int(self.last_move[1])
+        player = self.current_board[row, column]
+        rows, columns = self.current_board.shape
+
+        for direction in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            aligned = 1
+            for way in (1, -1):
+                i = row + way*direction[0]
+                j = column + way*direction[1]
+                while 0 <= i < rows and 0 <= j < columns and self.current_board[i, j] == player:
+                    aligned += 1
+                    i += way*direction[0]
+                    j += way*direction[1]
+            if aligned >= self.win_length: return int(player)
+
+        if self.moves_played == self.current_board.size: return "DRAW"
         return "CONTINUE"
 
     def convert_board_for_player(self, player_nbr):
@@ -147,54 +218,18 @@ class Game_system(Game_system_interface):
         2 = Player 2 played here
         Meanwhile, the AI needs to get arrays with -1, 0 and 1 where -1 is a
         space played by the opponent, 0 a space that wasn't played, and 1 a space
-        already played by the AI. This method takes care of converting the array
-        from one format to the other """
-
-        if player_nbr == 1:
-            board_for_player_1 = self.current_board.copy()
-            for index, value in np.ndenumerate(self.current_board):
-                if value == 1:
-                    board_for_player_1[index] = 1
-                elif value == 2:
-                    board_for_player_1[index] = -1
-                else:
-                    board_for_player_1[index] = 0
-            return board_for_player_1
-
-        elif player_nbr == 2:
-            board_for_player_2 = self.current_board.copy()
-            for index, value in np.ndenumerate(self.current_board):
-                if value == 1:
-                    board_for_player_2[index] = -1
-                elif value == 2:
-                    board_for_player_2[index] = 1
-                else:
-                    board_for_player_2[index] = 0
-            return board_for_player_2
+        already played by the AI. The board of each player is kept in this
+        format as well, and updated at every move (see record_move), so this
+        method only returns a read-only view of it: the players must copy the
+        board to play on it """
+
+        board = self.player_boards[player_nbr].view()
+        board.flags.writeable = False
+        return board
 
     def convert_back_board_from_ai(self, board, player_nbr):
 
         """This method does the opposit of convert_board_for_player. It converts
         back the array from a matrix of -1, 0 and 1 to a matrix of 0, 1 and 2 """
 
-        if player_nbr == 1:
-            actual_board = board.copy()
-            for index, value in np.ndenumerate(board):
-                if value == 1:
-                    actual_board[index] = 1
-                elif value == -1:
-                    actual_board[index] = 2
-                else:
-                    actual_board[index] = 0
-            return actual_board
-
-        elif player_nbr == 2:
-            actual_board = board.copy()
-            for index, value in np.ndenumerate(board):
-                if value == 1:
-                    actual_board[index] = 2
-                elif value == -1:
-                    actual_board[index] = 1
-                else:
-                    actual_board[index] = 0
-            return actual_board
+        return BOARD_FROM_PLAYER[player_nbr][board + 1]
@@ -1,5 +1,10 @@
 """ This class handles the display. See pygame doc for more
-details about how everything works """
+details about how everything works.
+
+The window is only redrawn when something changes: the spaces of the grid are
+computed once per board size, and after a move only the spaces that changed
+are repainted. While waiting for the user to play, the program sleeps until
+pygame receives an event instead of refreshing the window in a loop """
 
 import time
 import pygame
@@ -7,13 +12,24 @@ import numpy as np
 
 from interfaces import Graphics_interface
 
+# Maximum number of times per second the window is refreshed while the AI plays
+FRAME_RATE = 30
+
 class Graphics(Graphics_interface):
 
     def __init__(self):
 
         self.window_size = [850, 850]
         self.current_board = []
+
+        # Spaces of the grid for the current board size: [rect, (row, column)]
         self.grid = []
+        # Grids already computed, by board size
+        self.grids = {}
+
+        # Board as it is currently displayed. If None, the whole window is
+        # redrawn at the next update
+        self.displayed_board = None
 
         self.p1_is_ai = False
         self.p2_is_ai = False
@@ -25,6 +41,7 @@ class Graphics(Graphics_interface):
 
         pygame.init()
         self.screen = pygame.display.set_mode(self.window_size)
+        self.clock = pygame.time.Clock()
         self.title_font = pygame.font.SysFont('Comic Sans MS', 40)
         self.info_font = pygame.font.SysFont('Comic Sans MS', 30)
         self.title_surface = self.title_font.render('Tic-tac-toe - Reinforcment Learning', False, (0, 0, 0))
@@ -37,83 +54,119 @@ class Graphics(Graphics_interface):
         self.p2_is_ai = p2_is_ai
         self.p2_scores = p2_scores
 
+        # The scores changed: everything is redrawn
+        self.displayed_board = None
+
 
     def wait_for_move(self, current_board):
 
-        user_move = []
-        self.screen.fill((255, 255, 255))
+        self.draw_board(current_board)
 
-        self.screen.blit(self.title_surface, (self.window_size[0]*0.5 - (self.title_surface.get_width()/2), self.window_size[1]*0.05))
-        self.draw_grid(current_board)
-        self.display_scores()
+        # pygame.event.wait() sleeps until something happens in the window
+        while True:
+
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                return "EXIT"
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                area_clicked = self.process_click(event.pos[0], event.pos[1])
+                if area_clicked:
+                    self.current_board[area_clicked[0], area_clicked[1]] = 1
+                    return area_clicked
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                pygame.display.flip()
 
-        running = True
-        while running:
+    def update_display(self, current_board):
+
+        self.draw_board(current_board)
+
+        time_per_ai_move = 0
+        starting_time = time.time()
+        while True:
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     return "EXIT"
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    area_clicked = self.process_click(event.pos[0], event.pos[1])
-                    if area_clicked:
-                        self.current_board[area_clicked[0], area_clicked[1]] = 1
-                        return area_clicked
+                elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    pygame.display.flip()
 
+            if time.time() - starting_time >= time_per_ai_move: return
 
+            self.clock.tick(FRAME_RATE)
 
-            pygame.display.flip()
+    def draw_board(self, current_board):
 
-    def update_display(self, current_board):
+        """Updates the window to show current_board. Only the spaces that
+        changed since the last update are repainted, unless the board size or
+        the scores changed"""
+
+        self.current_board = current_board
+        if self.displayed_board is None or self.displayed_board.shape != current_board.shape:
+            self.redraw(current_board)
+            return
+
+        changed_rects = []
+        for row, column in np.argwhere(current_board != self.displayed_board).tolist():
+            changed_rects.append(self.draw_space(row, column, current_board[row, column]))
+
+        self.displayed_board = current_board.copy()
+        if changed_rects:
+            # The scores can overlap the spaces on the sides of the grid
+            changed_rects += self.display_scores()
+            pygame.display.update(changed_rects)
+
+    def redraw(self, current_board):
+
+        """Draws the whole window"""
+
+        self.grid = self.get_grid(current_board.shape)
 
         self.screen.fill((255, 255, 255))
-        self.draw_grid(current_board)
+        self.screen.blit(self.title_surface, (self.window_size[0]*0.5 - (self.title_surface.get_width()/2), self.window_size[1]*0.05))
+        for rect, index in self.grid: self.draw_space(index[0], index[1], current_board[index])
         self.display_scores()
 
-        running = True
-        time_per_ai_move = 0
-        starting_time = time.time()
-        while running:
+        self.displayed_board = current_board.copy()
+        pygame.display.flip()
 
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    return "EXIT"
+    def get_grid(self, board_shape):
 
-            if time.time() - starting_time >= time_per_ai_move: running = False
+        """Returns the spaces of the grid for a board of that shape, as a list
+        of [rect, (row, column)]. Only computed once per board shape"""
 
-            pygame.display.flip()
+        if board_shape not in self.grids:
 
+            space_width = round((self.window_size[0]*0.85 - self.window_size[0]*0.15) / board_shape[1])
+            space_height = round((self.window_size[1]*0.85 - self.window_size[1]*0.15) / board_shape[0])
+            grid = []
+            for column in range(board_shape[1]):
+                for row in range(board_shape[0]):
+                    x = round(self.window_size[0]*0.15) + column*space_width
+                    y = round(self.window_size[1]*0.15) + row*space_height
+                    grid.append([pygame.Rect(x, y, space_width, space_height), (row, column)])
+            self.grids[board_shape] = grid
 
-    def draw_grid(self, current_board):
+        return self.grids[board_shape]
 
-        self.current_board = current_board
-        space_width = round((self.window_size[0]*0.85 - self.window_size[0]*0.15) / self.current_board.shape[1])
-        space_height = round((self.window_size[1]*0.85 - self.window_size[1]*0.15) / self.current_board.shape[0])
-        x_index = 0
-        y_index = 0
-        for x in range(round(self.window_size[0]*0.15), round(self.window_size[0]*0.85), space_width):
-            for y in range(round(self.window_size[1]*0.15), round(self.window_size[1]*0.85), space_height):
-                rect = pygame.Rect(x, y, space_width, space_height)
-                self.grid.append([rect, (y_index, x_index)])
-                pygame.draw.rect(self.screen, (0, 0, 0), rect, 1)
-                y_index += 1
-            y_index = 0
-            x_index += 1
-
-
-        for index, value in np.ndenumerate(current_board):
-            if value == 1:
-                x = round(self.window_size[0]*0.15 + space_width * index[1])
-                y = round(self.window_size[1]*0.15 + space_height * index[0])
-                pos = (round(x + space_width/2), round(y + space_height/2))
-                pygame.draw.circle(self.screen, (0, 0, 255), pos, 0.45*space_height, 5)
-            elif value == 2:
-                x = round(self.window_size[0]*0.15 + space_width * index[1])
-                y = round(self.window_size[1]*0.15 + space_height * index[0])
-                pos = (round(x + space_width/2), round(y + space_height/2))
-                pygame.draw.circle(self.screen, (255, 0, 0), pos, 0.45*space_height, 5)
+    def draw_space(self, row, column, value):
+
+        """Draws a space of the grid and its symbol, if any. Returns its rect"""
+
+        rect = self.grid[column*self.current_board.shape[0] + row][0]
+        pygame.draw.rect(self.screen, (255, 255, 255), rect)
+        pygame.draw.rect(self.screen, (0, 0, 0), rect, 1)
+
+        if value == 1:
+            pygame.draw.circle(self.screen, (0, 0, 255), rect.center, 0.45*rect.height, 5)
+        elif value == 2:
+            pygame.draw.circle(self.screen, (255, 0, 0), rect.center, 0.45*rect.height, 5)
+
+        return rect
 
     def display_scores(self):
 
+        """Draws the scores, and returns the rects they cover"""
+
         p1_title = "Player 1"
         p2_title = "Player 2"
         if self.p1_is_ai: p1_title += " (AI)"
@@ -130,23 +183,24 @@ class Graphics(Graphics_interface):
         p1_lines = [p1_title, "Wins: " + p1_wins, "Losses: " + p1_losses, "Draws: " + p1_draws]
         p2_lines = [p2_title, "Wins: " + p2_wins, "Losses: " + p2_losses, "Draws: " + p2_draws]
 
+        rects = []
         starting_height_ratio = 0.75
         for l in p1_lines:
             surface = self.info_font.render(l, False, (0, 0, 255))
-            self.screen.blit(surface, (0, self.window_size[1]*starting_height_ratio))
+            rects.append(self.screen.blit(surface, (0, self.window_size[1]*starting_height_ratio)))
             starting_height_ratio += 0.05
 
         starting_height_ratio = 0.75
         for l in p2_lines:
             surface = self.info_font.render(l, False, (255, 0, 0))
-            self.screen.blit(surface, (self.window_size[0] * 0.85, self.window_size[1]*starting_height_ratio))
+            rects.append(self.screen.blit(surface, (self.window_size[0] * 0.85, self.window_size[1]*starting_height_ratio)))
             starting_height_ratio += 0.05
 
+        return rects
+
 
     def process_click(self, click_position_x, click_position_y):
 
-        space_width = round((self.window_size[0]*0.85 - self.window_size[0]*0.15) / self.current_board.shape[1])
-        space_height = round((self.window_size[1]*0.86 - self.window_size[1]*0.15) / self.current_board.shape[0])
         for s in self.grid:
             if s[0].collidepoint(click_position_x, click_position_y):
                 array_index = s[1]
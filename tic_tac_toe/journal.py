@@ -0,0 +1,307 @@
+"""Instead of rewriting the whole training data after every game, the AI
+appends the updates of each game (state key, value, occurences) to a journal.
+The cost of saving a game then only depends on how many moves were played.
+
+The journal is split in numbered files (training.journal.0, training.journal.1
+...). The header of the snapshot (training.bin) tells which generation it was
+written at: it already includes every file of a lower generation. When the
+current journal file gets too big, the journal switches to a new generation and
+a background thread folds the older files into a new snapshot.
+
+A game is appended as a single block. If the program stops while a block is
+being written, the incomplete block is ignored and removed at the next start,
+so a crash can never corrupt the training data.
+
+Nothing is written by the thread calling append: the updates are queued and
+written by a background thread, so the game never waits for the disk. A new
+snapshot is also written when SNAPSHOT_PERIOD seconds went by since the last
+one. The journals returned by get_journal are flushed and closed when the
+program exits"""
+
+import os
+import glob
+import time
+import queue
+import atexit
+import struct
+import threading
+
+import numpy as np
+
+import persistence
+from state_store import State_store
+
+JOURNAL_FILE = 'training.journal'
+
+# Block header: number of records in the block, key width (bytes)
+BLOCK_HEADER = struct.Struct('<II')
+
+# Number of records after which the journal is folded into a new snapshot
+COMPACTION_THRESHOLD = 200000
+
+# Seconds after which the journal is folded into a new snapshot, whatever its
+# size
+SNAPSHOT_PERIOD = 600
+
+
+class Journal:
+
+    def __init__(self, snapshot_path=persistence.TRAINING_FILE, journal_path=JOURNAL_FILE,
+                 compaction_threshold=COMPACTION_THRESHOLD, snapshot_period=SNAPSHOT_PERIOD):
+
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compaction_threshold = compaction_threshold
+        self.snapshot_period = snapshot_period
+
+        self.generation = 0
+        self.records_nbr = 0
+        self.journal_file = None
+        self.lock = threading.Lock()
+        self.compaction_thread = None
+        self.last_snapshot_time = time.time()
+
+        # Updates waiting to be written by the writer thread, started by the
+        # first append. None tells the thread to stop
+        self.queue = queue.Queue()
+        self.writer_thread = None
+        self.writer_error = None
+
+    def load(self, max_states=None, spill_store=None):
+
+        """Loads the last snapshot and replays the journal on top of it. Returns
+        the resulting State_store. If max_states is set, the store never holds
+        more states than that in memory, even while loading: the others are
+        moved to spill_store (see State_store.set_memory_budget)"""
+
+        if os.path.exists(self.snapshot_path):
+            store = persistence.load_training_data(self.snapshot_path, max_states, spill_store)
+            snapshot_generation = persistence.read_header(self.snapshot_path)[2]
+
+        elif self.get_json_path() is not None and os.path.exists(self.get_json_path()):
+            # First start since the training data moved to the binary format.
+            # This only happens once, so the whole JSON file is loaded
+            store = persistence.import_json(self.get_json_path())
+            persistence.save_training_data(store, self.snapshot_path)
+            store.set_memory_budget(max_states, spill_store)
+            snapshot_generation = 0
+
+        else:
+            store = State_store()
+            store.set_memory_budget(max_states, spill_store)
+            snapshot_generation = 0
+
+        self.generation = snapshot_generation
+        self.records_nbr = 0
+        for generation, path in self.get_journal_files():
+            if generation < snapshot_generation:
+                # Left over by a compaction that stopped before cleaning up
+                os.remove(path)
+                continue
+            self.records_nbr += self.replay(path, store)
+            self.generation = max(self.generation, generation)
+
+        return store
+
+    def append(self, deltas):
+
+        """Appends the updates of one game to the journal. deltas is a list of
+        (key, value, occurences) tuples, value being the sum of the results
+        added to the state. They are only queued: see write_deltas"""
+
+        if not deltas: return
+        if self.writer_error is not None: raise self.writer_error
+
+        with self.lock:
+            if self.writer_thread is None:
+                self.writer_thread = threading.Thread(target=self.write_queued_deltas, daemon=True)
+                self.writer_thread.start()
+
+        self.queue.put(list(deltas))
+
+    def write_queued_deltas(self):
+
+        """Runs in the writer thread until close is called"""
+
+        while True:
+            deltas = self.queue.get()
+            try:
+                if deltas is None: return
+                self.write_deltas(deltas)
+            except Exception as error:
+                self.writer_error = error
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+
+        """Waits until every queued update is written"""
+
+        if self.writer_thread is not None: self.queue.join()
+        if self.writer_error is not None: raise self.writer_error
+
+    def write_deltas(self, deltas):
+
+        """Writes the updates of one game at the end of the journal file"""
+
+        blocks = []
+        for key_width in sorted({len(d[0]) for d in deltas}):
+            # A block only holds keys of the same width (i.e. of boards of the
+            # same dimensions)
+            block = [d for d in deltas if len(d[0]) == key_width]
+            records = np.empty(len(block), dtype=persistence.get_record_dtype(key_width))
+            records['key'] = persistence.keys_to_array([d[0] for d in block], key_width)
+            records['value'] = [d[1] for d in block]
+            records['occurences'] = [d[2] for d in block]
+            blocks.append(BLOCK_HEADER.pack(len(block), key_width) + records.tobytes())
+
+        with self.lock:
+            if self.journal_file is None:
+                self.journal_file = open(self.get_journal_path(self.generation), 'ab')
+            self.journal_file.write(b''.join(blocks))
+            self.journal_file.flush()
+            self.records_nbr += len(deltas)
+
+            if self.records_nbr >= self.compaction_threshold: self.compact()
+            elif time.time() - self.last_snapshot_time >= self.snapshot_period: self.compact()
+
+    def compact(self):
+
+        """Switches to a new journal file and folds the previous ones into a new
+        snapshot in a background thread. Must be called with the lock held"""
+
+        if self.compaction_thread is not None and self.compaction_thread.is_alive(): return
+
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+        self.generation += 1
+        self.records_nbr = 0
+        self.last_snapshot_time = time.time()
+
+        self.compaction_thread = threading.Thread(target=self.write_snapshot, args=(self.generation,))
+        self.compaction_thread.start()
+
+    def write_snapshot(self, generation):
+
+        """Adds the updates of the journal files older than generation to the
+        last snapshot. The updates are summed by state first, then merged into
+        the snapshot while it is streamed to the new one (see
+        persistence.merge_training_data): the memory needed only depends on the
+        size of the journal, not on the size of the training data. This
+        doesn't touch the AI's own copy of the training data, so it can run
+        while the AI keeps playing"""
+
+        old_files = [j for j in self.get_journal_files() if j[0] < generation]
+        deltas = {}
+        for _, path in old_files:
+            for keys, values, occurences in self.read_blocks(path):
+                for key, value, occurence in zip(keys, values, occurences):
+                    delta = deltas.setdefault(key, [0, 0])
+                    delta[0] += value
+                    delta[1] += occurence
+
+        persistence.merge_training_data(deltas, self.snapshot_path, generation)
+        for _, path in old_files:
+            os.remove(path)
+
+    def close(self):
+
+        """Writes the queued updates, closes the current journal file and waits
+        for the compaction in progress, if any"""
+
+        with self.lock:
+            writer_thread = self.writer_thread
+            self.writer_thread = None
+        if writer_thread is not None:
+            self.queue.put(None)
+            writer_thread.join()
+
+        with self.lock:
+            if self.journal_file is not None:
+                self.journal_file.close()
+                self.journal_file = None
+
+        if self.compaction_thread is not None: self.compaction_thread.join()
+
+    def replay(self, path, store):
+
+        """Adds every update stored in a journal file to store. Returns the
+        number of records replayed"""
+
+        records_nbr = 0
+        for keys, values, occurences in self.read_blocks(path):
+            for key, value, occurence in zip(keys, values, occurences):
+                store.add_result(key, value, occurence)
+            records_nbr += len(keys)
+
+        return records_nbr
+
+    def read_blocks(self, path):
+
+        """Iterates over the blocks of a journal file, as (keys, values,
+        occurences) lists"""
+
+        with open(path, 'rb') as journal_file:
+            data = journal_file.read()
+
+        position = 0
+        while position + BLOCK_HEADER.size <= len(data):
+
+            block_size, key_width = BLOCK_HEADER.unpack_from(data, position)
+            record_dtype = persistence.get_record_dtype(key_width)
+            block_end = position + BLOCK_HEADER.size + block_size*record_dtype.itemsize
+            if block_end > len(data): break
+
+            records = np.frombuffer(data, dtype=record_dtype, count=block_size,
+                                    offset=position + BLOCK_HEADER.size)
+            yield persistence.array_to_keys(records['key']), records['value'].tolist(), records['occurences'].tolist()
+
+            position = block_end
+
+        if position < len(data):
+            # The end of the file is an incomplete block: the program stopped
+            # while writing it
+            with open(path, 'r+b') as journal_file: journal_file.truncate(position)
+
+    def get_json_path(self):
+
+        """Returns the training data file of earlier versions to import when
+        there is no snapshot yet: the training.json next to the snapshot, only
+        if the snapshot has the default name (training.bin). None otherwise"""
+
+        if os.path.basename(self.snapshot_path) != persistence.TRAINING_FILE: return None
+        return os.path.join(os.path.dirname(self.snapshot_path), persistence.JSON_TRAINING_FILE)
+
+    def get_journal_path(self, generation):
+
+        return self.journal_path + '.' + str(generation)
+
+    def get_journal_files(self):
+
+        """Returns the (generation, path) of every journal file, oldest first"""
+
+        journal_files = []
+        for path in glob.glob(glob.escape(self.journal_path) + '.*'):
+            suffix = path[len(self.journal_path)+1:]
+            if suffix.isdigit(): journal_files.append((int(suffix), path))
+
+        return sorted(journal_files)
+
+
+_journals = {}
+
+
+def get_journal(snapshot_path=persistence.TRAINING_FILE, journal_path=JOURNAL_FILE):
+
+    """Returns the journal used for these files. AIs running in the same
+    process share it, so that their updates end up in the same file and a
+    compaction started by one of them can't lose the updates of the other"""
+
+    key = (os.path.abspath(snapshot_path), os.path.abspath(journal_path))
+    if key not in _journals:
+        _journals[key] = Journal(snapshot_path, journal_path)
+        # The updates still queued are written before the program exits
+        atexit.register(_journals[key].close)
+
+    return _journals[key]
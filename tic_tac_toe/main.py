@@ -2,36 +2,67 @@
 Read the comments below to understand how the different parameters work"""
 
 from ai import AI
+from model import get_model
+from opening_book import load_opening_book
 from game_system import Game_system
+from bitboard_game_system import Bitboard_game_system
 from human_player import Human_player
 from graphics import Graphics
 
 # If this value is set to False, you play against the AI
 # If it is set to True, the AI plays agains itself. In that case, the data from
-# both players is used to train the model.
+# both players is used to train the model. Both AIs share the same model, so
+# neither of them loses the updates made by the other.
 both_players_are_AI = False
 
 # Only usable if both_players_are_AI is set to True
 no_display = False
 if no_display and not both_players_are_AI: no_display = False
 
+# Maximum number of states of the training data kept in memory (None: no
+# limit). When it is reached, the states used the least are moved to a file on
+# disk (see spill_store.py), so that long training runs can't use up the memory
+max_states = None
+
+# Both AIs share the same model (see model.py)
+model = get_model(max_states=max_states)
+
 if both_players_are_AI:
-    player_1 = AI()
-    player_2 = AI()
+    player_1 = AI(model)
+    player_2 = AI(model)
 else:
     player_1 = Human_player()
-    player_2 = AI()
+    player_2 = AI(model)
+
+# If this value is set to True, the game system uses bitboards to check for the
+# end of the game (faster, see bitboard_game_system.py)
+use_bitboards = True
+
+# Dimensions of the board, and number of symbols a player has to align to win
+# (e.g. (15,15) and 5 to play gomoku)
+board_dimensions = (3,3)
+win_length = 3
+
+# If this value is set to True and an opening book was built (run
+# opening_book.py), the AI plays the first moves of the game from the book.
+# It is only used against a human: in self-play, the AI would never try other
+# openings
+use_opening_book = True
+if use_opening_book and not both_players_are_AI: player_2.opening_book = load_opening_book(win_length)
 
 # graphics handles everything related to the display of the game
 # game_system sets the rules and oversees the game
 
+if use_bitboards: game_system_class = Bitboard_game_system
+else: game_system_class = Game_system
+
 if no_display:
-    game_system = Game_system(player_1, player_2)
+    game_system = game_system_class(player_1, player_2, win_length=win_length)
 
 else:
     graphics = Graphics()
-    game_system = Game_system(player_1, player_2, graphics)
+    game_system = game_system_class(player_1, player_2, graphics, win_length)
 
 # This is the main loop. It will keep starting new games until you close the
-# game window. The tuple inside brackets is the shape of the board
-while game_system.play_a_game((3,3)): pass
+# game window
+while game_system.play_a_game(board_dimensions): pass
@@ -0,0 +1,339 @@
+"""Inherits from Player_interface. A player based on Monte Carlo Tree Search:
+instead of searching every possible sequence of moves (see minimax_player.py),
+it plays many random games (rollouts) from the current position and grows a
+tree of the moves that look the most promising, using the UCT formula to
+balance trying new moves and looking deeper into the good ones. It doesn't need
+any training, and the time it takes to play a move is bounded, so it can play
+on boards far too large for the AI's training data.
+
+The budget of each move is set by rollouts (number of random games) and/or
+time_budget (seconds), at least one of them being set. Whatever the budget, at
+least one batch of rollouts is played, so that there is always a move to pick. Rollouts are played rollouts_per_leaf at a time from
+the same position, as a batch of boards moved with array operations. With
+workers > 1, the rollouts of a move are split between several processes, each
+one growing its own tree, and the visits of the moves are added up. The worker
+processes are started by the first move and run until close is called.
+
+The tree is kept from one move to the next: after the opponent plays, the part
+of the tree under the new position becomes the new tree, so the rollouts
+already played from there aren't lost. With workers > 1, each worker keeps its
+own tree the same way"""
+
+import math
+import time
+import random
+import multiprocessing
+
+import numpy as np
+
+from interfaces import Player_interface
+from bitboard_game_system import get_masks
+from batch_game_system import get_lines_by_space
+
+
+class Mcts_node:
+
+    """A position of the tree. own_spaces are the spaces of the player about to
+    play, opponent_spaces those of the player who just played. wins counts the
+    results of the rollouts for the player who just played (1 for a win, 0.5 for
+    a draw)"""
+
+    __slots__ = ("own_spaces", "opponent_spaces", "parent", "children", "untried_moves",
+                 "visits", "wins", "result")
+
+    def __init__(self, own_spaces, opponent_spaces, parent, untried_moves, result=None):
+
+        self.own_spaces = own_spaces
+        self.opponent_spaces = opponent_spaces
+        self.parent = parent
+        self.children = {}
+        self.untried_moves = untried_moves
+        self.visits = 0
+        self.wins = 0.0
+        # For the end of a game: 1 if the player who just played won, 0.5 for a
+        # draw. None otherwise
+        self.result = result
+
+
+class Mcts_player(Player_interface):
+
+    def __init__(self, win_length=3, rollouts=2000, time_budget=None, rollouts_per_leaf=8,
+                 exploration=math.sqrt(2), workers=1):
+
+        self.is_AI = True
+
+        # Without any budget, the search would never stop
+        if rollouts is None and time_budget is None:
+            raise ValueError("Mcts_player needs a number of rollouts or a time budget")
+
+        self.win_length = win_length
+        self.rollouts = rollouts
+        self.time_budget = time_budget
+        self.rollouts_per_leaf = rollouts_per_leaf
+        self.exploration = exploration
+        self.workers = workers
+
+        self.board_dimensions = None
+        self.root = None
+        # Connections to the worker processes, when workers > 1
+        self.worker_connections = None
+        self.worker_processes = None
+
+    def play(self, current_state):
+
+        """current_state: numpy array showing the current state of the board
+        (1: this player, -1: the opponent)
+        return value: numpy array of the board including the chosen move"""
+
+        if current_state.shape != self.board_dimensions: self.setup(current_state.shape)
+
+        flat_state = current_state.ravel()
+        own_spaces = to_bitboard(flat_state == 1)
+        opponent_spaces = to_bitboard(flat_state == -1)
+
+        if self.workers > 1:
+            # The trees are in the worker processes
+            move = self.search_in_parallel(own_spaces, opponent_spaces)
+        else:
+            self.root = self.find_root(own_spaces, opponent_spaces)
+            self.search(self.root, self.rollouts, self.time_budget)
+            move = max(self.root.children, key=lambda m: self.root.children[m].visits)
+            self.keep_subtree(move)
+
+        new_state = current_state.copy()
+        new_state.flat[move] = 1
+        return new_state
+
+    def notify_game_result(self, result):
+
+        self.root = None
+        if self.worker_connections is not None:
+            for connection in self.worker_connections: connection.send(("reset",))
+
+    def close(self):
+
+        """Stops the worker processes, if any. The player can still be used:
+        they are started again by the next move"""
+
+        if self.worker_connections is None: return
+
+        for connection in self.worker_connections: connection.send(None)
+        for process in self.worker_processes: process.join()
+        for connection in self.worker_connections: connection.close()
+        self.worker_connections = None
+        self.worker_processes = None
+
+    def keep_subtree(self, move):
+
+        """The subtree of the chosen move becomes the tree for the next move"""
+
+        self.root = self.root.children.get(move) if self.root is not None else None
+        if self.root is not None: self.root.parent = None
+
+    def setup(self, board_dimensions):
+
+        self.board_dimensions = board_dimensions
+        self.root = None
+        self.full_board_mask, self.lines_by_space = get_masks(tuple(board_dimensions), self.win_length)
+        self.rollout_lines = get_lines_by_space(tuple(board_dimensions), self.win_length)
+        self.spaces_nbr = board_dimensions[0]*board_dimensions[1]
+
+    def find_root(self, own_spaces, opponent_spaces):
+
+        """Looks for the current position among the positions following the
+        last move played (i.e. one for every move the opponent could play).
+        Creates a new tree if it isn't there"""
+
+        if self.root is not None:
+            for child in self.root.children.values():
+                if child.own_spaces == own_spaces and child.opponent_spaces == opponent_spaces:
+                    child.parent = None
+                    return child
+
+        return Mcts_node(own_spaces, opponent_spaces, None, self.get_moves(own_spaces | opponent_spaces))
+
+    def get_moves(self, occupied_spaces):
+
+        moves = [s for s in range(self.spaces_nbr) if not occupied_spaces >> s & 1]
+        random.shuffle(moves)
+        return moves
+
+    def search(self, root, rollouts, time_budget):
+
+        """Grows the tree from root until the budget is spent. At least one
+        batch of rollouts is played, so that root always has a child"""
+
+        deadline = None
+        if time_budget is not None: deadline = time.time() + time_budget
+
+        rollouts_played = 0
+        while True:
+            node = self.select(root)
+            if node.result is not None:
+                # The game is over in this position: no rollout needed
+                self.backpropagate(node, node.result*self.rollouts_per_leaf, self.rollouts_per_leaf)
+            else:
+                if node.untried_moves: node = self.expand(node)
+                if node.result is not None:
+                    self.backpropagate(node, node.result*self.rollouts_per_leaf, self.rollouts_per_leaf)
+                else:
+                    self.backpropagate(node, self.rollout(node), self.rollouts_per_leaf)
+            rollouts_played += self.rollouts_per_leaf
+
+            if rollouts is not None and rollouts_played >= rollouts: break
+            if deadline is not None and time.time() > deadline: break
+
+    def select(self, node):
+
+        """Goes down the tree, picking the child with the best UCT score, until
+        a node with untried moves (or the end of a game) is reached"""
+
+        while node.result is None and not node.untried_moves and node.children:
+            log_visits = math.log(node.visits)
+            node = max(node.children.values(),
+                       key=lambda c: c.wins / c.visits + self.exploration * math.sqrt(log_visits / c.visits))
+        return node
+
+    def expand(self, node):
+
+        """Adds to the tree the position following one of the untried moves"""
+
+        move = node.untried_moves.pop()
+        new_spaces = node.own_spaces | (1 << move)
+        occupied_spaces = new_spaces | node.opponent_spaces
+
+        result = None
+        if any(new_spaces & line_mask == line_mask for line_mask in self.lines_by_space[move]): result = 1
+        elif occupied_spaces == self.full_board_mask: result = 0.5
+
+        untried_moves = [] if result is not None else self.get_moves(occupied_spaces)
+        child = Mcts_node(node.opponent_spaces, new_spaces, node, untried_moves, result)
+        node.children[move] = child
+        return child
+
+    def rollout(self, node):
+
+        """Plays rollouts_per_leaf random games from the position of node, all
+        at once. Returns the total result for the player who just played"""
+
+        boards = np.zeros((self.rollouts_per_leaf, self.spaces_nbr), dtype=np.int8)
+        boards[:, np.flatnonzero(from_bitboard(node.own_spaces, self.spaces_nbr))] = 1
+        boards[:, np.flatnonzero(from_bitboard(node.opponent_spaces, self.spaces_nbr))] = -1
+
+        # results: 1 if the player about to play wins, -1 if they lose, 0 for a
+        # draw, None (NaN) while the game is running
+        results = np.full(self.rollouts_per_leaf, np.nan)
+        running = np.arange(self.rollouts_per_leaf)
+        player = 1
+        while running.size:
+            running_boards = boards[running]
+            empty_spaces = running_boards == 0
+            has_moves = empty_spaces.any(axis=1)
+            results[running[~has_moves]] = 0
+            running = running[has_moves]
+            if running.size == 0: break
+
+            # Picking a random empty space on every board
+            priorities = np.where(empty_spaces[has_moves], np.random.random((running.size, self.spaces_nbr)), -1)
+            moves = priorities.argmax(axis=1)
+            boards[running, moves] = player
+
+            lines = boards[running[:, None, None], self.rollout_lines[moves]]
+            won = np.any(np.all(lines == player, axis=2), axis=1)
+            results[running[won]] = player
+            running = running[~won]
+            player = -player
+
+        # Converting to the point of view of the player who just played
+        return float(np.sum((1 - results) / 2))
+
+    def backpropagate(self, node, wins, visits):
+
+        """Adds the results to every node from node up to the root. The results
+        are for the player who played the move leading to node, so they switch
+        sides at every level"""
+
+        while node is not None:
+            node.visits += visits
+            node.wins += wins
+            wins = visits - wins
+            node = node.parent
+
+    def search_in_parallel(self, own_spaces, opponent_spaces):
+
+        """Splits the budget between the workers, each growing its own tree from
+        the current position. Returns the move with the most visits overall"""
+
+        if self.worker_connections is None: self.start_workers()
+
+        for connection in self.worker_connections:
+            connection.send(("search", self.board_dimensions, own_spaces, opponent_spaces))
+
+        visits = {}
+        for connection in self.worker_connections:
+            for move, v in connection.recv().items(): visits[move] = visits.get(move, 0) + v
+        move = max(visits, key=visits.get)
+
+        for connection in self.worker_connections: connection.send(("play", move))
+        return move
+
+    def start_workers(self):
+
+        rollouts = None if self.rollouts is None else -(-self.rollouts // self.workers)
+        self.worker_connections = []
+        self.worker_processes = []
+        for i in range(self.workers):
+            connection, worker_connection = multiprocessing.Pipe()
+            # Daemon processes, so that they can't outlive the program if close
+            # isn't called
+            process = multiprocessing.Process(target=search_worker, daemon=True,
+                                              args=(worker_connection, self.win_length, rollouts, self.time_budget,
+                                                    self.rollouts_per_leaf, self.exploration))
+            process.start()
+            worker_connection.close()
+            self.worker_connections.append(connection)
+            self.worker_processes.append(process)
+
+
+def search_worker(connection, win_length, rollouts, time_budget, rollouts_per_leaf, exploration):
+
+    """Runs in a worker process (see Mcts_player.search_in_parallel) until it
+    receives None. Keeps its own tree from one move to the next, like a
+    player with a single worker. Messages:
+    ("search", board dimensions, own spaces, opponent spaces): searches from
+    this position, and answers with the number of visits of every move
+    ("play", move): the move that was played
+    ("reset",): the game is over"""
+
+    random.seed()
+    np.random.seed()
+
+    player = Mcts_player(win_length, rollouts, time_budget, rollouts_per_leaf, exploration)
+    while True:
+        message = connection.recv()
+        if message is None: break
+
+        if message[0] == "search":
+            _, board_dimensions, own_spaces, opponent_spaces = message
+            if board_dimensions != player.board_dimensions: player.setup(board_dimensions)
+            player.root = player.find_root(own_spaces, opponent_spaces)
+            player.search(player.root, rollouts, time_budget)
+            connection.send({move: child.visits for move, child in player.root.children.items()})
+        elif message[0] == "play":
+            player.keep_subtree(message[1])
+        else:
+            player.root = None
+
+    connection.close()
+
+
+def to_bitboard(flat_mask):
+
+    bitboard = 0
+    for space in np.flatnonzero(flat_mask).tolist(): bitboard |= 1 << space
+    return bitboard
+
+
+def from_bitboard(bitboard, spaces_nbr):
+
+    return np.array([bitboard >> s & 1 for s in range(spaces_nbr)], dtype=bool)
@@ -0,0 +1,233 @@
+"""Inherits from Player_interface. A player that doesn't learn: it looks ahead
+at every possible sequence of moves with the negamax algorithm (minimax where
+the value of a position for a player is minus its value for the opponent) and
+picks the best move. It is used as a reference to assess the AI.
+
+To go fast, the search uses:
+- alpha-beta pruning: the sequences that can't change the result are skipped
+- a transposition table: the value of every position already searched is
+  stored, since the same position can be reached in different orders
+- move ordering: the most promising moves are searched first (the best move
+  found by a previous search, winning moves, moves blocking the opponent, then
+  the spaces crossed by the most lines), which makes the pruning more efficient
+
+On a 3x3 board the whole game is searched, so the player never loses. On larger
+boards the search is limited by max_depth and/or time_budget (seconds per
+move): it searches deeper and deeper until it runs out of time, and positions
+where the search stops are scored by counting the lines each player can still
+complete. Only the spaces next to the symbols already played are considered"""
+
+import time
+
+import numpy as np
+
+from interfaces import Player_interface
+from bitboard_game_system import get_masks
+from game_system import get_winning_lines
+
+WIN_SCORE = 1000000
+
+# Flags telling what a value stored in the transposition table means
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Boards with more spaces than this only consider the moves next to the
+# symbols already played
+FULL_SEARCH_SPACES = 25
+
+
+class Search_timeout(Exception):
+    pass
+
+
+class Minimax_player(Player_interface):
+
+    def __init__(self, win_length=3, max_depth=None, time_budget=None, max_table_size=2000000):
+
+        self.is_AI = True
+
+        self.win_length = win_length
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.max_table_size = max_table_size
+
+        self.board_dimensions = None
+        self.transposition_table = {}
+
+    def play(self, current_state):
+
+        """current_state: numpy array showing the current state of the board
+        (1: this player, -1: the opponent)
+        return value: numpy array of the board including the chosen move"""
+
+        if current_state.shape != self.board_dimensions: self.setup(current_state.shape)
+
+        flat_state = current_state.ravel()
+        own_spaces = self.to_bitboard(flat_state == 1)
+        opponent_spaces = self.to_bitboard(flat_state == -1)
+
+        new_state = current_state.copy()
+        new_state.flat[self.search(own_spaces, opponent_spaces)] = 1
+        return new_state
+
+    def notify_game_result(self, result):
+
+        return
+
+    def setup(self, board_dimensions):
+
+        """Precomputes everything that only depends on the board's dimensions"""
+
+        self.board_dimensions = board_dimensions
+        self.transposition_table = {}
+
+        self.full_board_mask, self.lines_by_space = get_masks(tuple(board_dimensions), self.win_length)
+        self.line_masks = [sum(1 << s for s in line) for line in get_winning_lines(board_dimensions, self.win_length).tolist()]
+        self.spaces_nbr = board_dimensions[0]*board_dimensions[1]
+
+        # Spaces crossed by many lines are usually better, so they are searched first
+        self.spaces_by_weight = sorted(range(self.spaces_nbr), key=lambda s: -len(self.lines_by_space[s]))
+
+        # neighbours[s]: bitmask of the spaces around s
+        rows, columns = board_dimensions
+        self.neighbours = []
+        for space in range(self.spaces_nbr):
+            row, column = divmod(space, columns)
+            mask = 0
+            for i in range(max(0, row-1), min(rows, row+2)):
+                for j in range(max(0, column-1), min(columns, column+2)):
+                    mask |= 1 << (i*columns + j)
+            self.neighbours.append(mask)
+
+    def to_bitboard(self, flat_mask):
+
+        bitboard = 0
+        for space in np.flatnonzero(flat_mask).tolist(): bitboard |= 1 << space
+        return bitboard
+
+    def search(self, own_spaces, opponent_spaces):
+
+        """Iterative deepening: searches 1 move ahead, then 2, etc. until the
+        maximum depth is reached or the time is up. Returns the best move of the
+        deepest search completed"""
+
+        empty_spaces_nbr = self.spaces_nbr - (own_spaces | opponent_spaces).bit_count()
+        max_depth = empty_spaces_nbr
+        if self.max_depth is not None: max_depth = min(max_depth, self.max_depth)
+
+        self.deadline = None
+        if self.time_budget is not None: self.deadline = time.time() + self.time_budget
+        self.nodes_searched = 0
+
+        if len(self.transposition_table) > self.max_table_size: self.transposition_table.clear()
+
+        best_move = self.order_moves(own_spaces, opponent_spaces, None)[0]
+        for depth in range(1, max_depth+1):
+            try:
+                value, move = self.negamax(own_spaces, opponent_spaces, depth, -WIN_SCORE-1, WIN_SCORE+1)
+            except Search_timeout:
+                break
+            best_move = move
+            # No need to search deeper once the result of the game is known
+            if abs(value) > WIN_SCORE - self.spaces_nbr - 1: break
+
+        return best_move
+
+    def negamax(self, own_spaces, opponent_spaces, depth, alpha, beta):
+
+        """Returns the value of the position for the player about to play (own
+        spaces), and the best move"""
+
+        self.nodes_searched += 1
+        if self.deadline is not None and self.nodes_searched % 1024 == 0 and time.time() > self.deadline:
+            raise Search_timeout()
+
+        key = (own_spaces, opponent_spaces)
+        entry = self.transposition_table.get(key)
+        table_move = None
+        if entry is not None:
+            entry_depth, entry_value, entry_flag, table_move = entry
+            if entry_depth >= depth:
+                if entry_flag == EXACT: return entry_value, table_move
+                if entry_flag == LOWER_BOUND: alpha = max(alpha, entry_value)
+                else: beta = min(beta, entry_value)
+                if alpha >= beta: return entry_value, table_move
+
+        occupied_spaces = own_spaces | opponent_spaces
+        if occupied_spaces == self.full_board_mask: return 0, None
+        if depth == 0: return self.evaluate(own_spaces, opponent_spaces), None
+
+        # Faster wins are better: the value of a win decreases with the number
+        # of symbols on the board
+        win_value = WIN_SCORE - occupied_spaces.bit_count()
+
+        original_alpha = alpha
+        best_value = -WIN_SCORE - 1
+        best_move = None
+        for space in self.order_moves(own_spaces, opponent_spaces, table_move):
+
+            new_own_spaces = own_spaces | (1 << space)
+            if self.is_winning(new_own_spaces, space):
+                value = win_value
+            else:
+                value = -self.negamax(opponent_spaces, new_own_spaces, depth-1, -beta, -alpha)[0]
+
+            if value > best_value:
+                best_value = value
+                best_move = space
+            alpha = max(alpha, value)
+            if alpha >= beta: break
+
+        if best_value <= original_alpha: flag = UPPER_BOUND
+        elif best_value >= beta: flag = LOWER_BOUND
+        else: flag = EXACT
+        self.transposition_table[key] = (depth, best_value, flag, best_move)
+
+        return best_value, best_move
+
+    def is_winning(self, spaces, last_space):
+
+        for line_mask in self.lines_by_space[last_space]:
+            if spaces & line_mask == line_mask: return True
+        return False
+
+    def order_moves(self, own_spaces, opponent_spaces, table_move):
+
+        """Returns the legal moves, most promising first"""
+
+        occupied_spaces = own_spaces | opponent_spaces
+        candidates = self.full_board_mask & ~occupied_spaces
+
+        if self.spaces_nbr > FULL_SEARCH_SPACES and occupied_spaces:
+            around = 0
+            for space in self.spaces_by_weight:
+                if occupied_spaces >> space & 1: around |= self.neighbours[space]
+            candidates &= around
+
+        winning_moves = []
+        blocking_moves = []
+        other_moves = []
+        for space in self.spaces_by_weight:
+            if not candidates >> space & 1 or space == table_move: continue
+            if self.is_winning(own_spaces | (1 << space), space): winning_moves.append(space)
+            elif self.is_winning(opponent_spaces | (1 << space), space): blocking_moves.append(space)
+            else: other_moves.append(space)
+
+        moves = winning_moves + blocking_moves + other_moves
+        if table_move is not None and candidates >> table_move & 1: moves.insert(0, table_move)
+        return moves
+
+    def evaluate(self, own_spaces, opponent_spaces):
+
+        """Scores a position where the search stops: every line only one player
+        has played on counts for this player, 4 times more for every symbol
+        already on it, so that almost complete lines weigh the most"""
+
+        score = 0
+        for line_mask in self.line_masks:
+            own = own_spaces & line_mask
+            opponent = opponent_spaces & line_mask
+            if own and not opponent: score += 4**own.bit_count()
+            elif opponent and not own: score -= 4**opponent.bit_count()
+        return score
@@ -0,0 +1,111 @@
+"""The training data used by the AI (see ai.py), wrapped so that any number of
+AI players can share it. When the AI plays against itself, both players use the
+same model: the training data is only loaded once, and each player sees what
+the other one learnt.
+
+During a game, a player only reads the model and keeps the updates it wants to
+make aside (see AI.update_training_data). At the end of the game they are
+merged into the model all at once, and journaled if the model is saved on disk
+(see journal.py). Reads and merges are done under a lock, so players can run on
+different threads without losing any update"""
+
+import os
+import threading
+
+import persistence
+from journal import get_journal, JOURNAL_FILE
+from spill_store import Spill_store
+
+
+class Value_model:
+
+    def __init__(self, store, journal=None, keep_deltas=False):
+
+        """store: State_store holding the value of every known state
+        journal: Journal the merged updates are appended to. If None, the
+        updates are only kept in memory
+        keep_deltas: if True, the merged updates are also kept in merged_deltas
+        until they are taken with take_merged_deltas (used by train.py)"""
+
+        self.store = store
+        self.journal = journal
+        self.merged_deltas = [] if keep_deltas else None
+        self.lock = threading.RLock()
+
+    def __len__(self):
+
+        return len(self.store)
+
+    def get_value(self, key, default=None):
+
+        with self.lock:
+            return self.store.get_value(key, default)
+
+    def get_values(self, keys):
+
+        with self.lock:
+            return self.store.get_values(keys)
+
+    def merge(self, deltas):
+
+        """Adds the updates of a player to the model.
+        deltas: list of (key, value, occurences), see State_store.add_result"""
+
+        if not deltas: return
+
+        with self.lock:
+            for key, value, occurences in deltas: self.store.add_result(key, value, occurences)
+            if self.journal is not None: self.journal.append(deltas)
+            if self.merged_deltas is not None: self.merged_deltas.extend(deltas)
+
+    def set_memory_budget(self, max_states, spill_path=None):
+
+        """Limits the number of states kept in memory (see
+        State_store.set_memory_budget). If spill_path is given, the states
+        evicted from memory are moved to a Spill_store in this file"""
+
+        with self.lock:
+            # States already moved to the disk stay there
+            spill_store = self.store.spill_store
+            if spill_store is None and spill_path is not None: spill_store = Spill_store(spill_path)
+            self.store.set_memory_budget(max_states, spill_store)
+
+    def take_merged_deltas(self):
+
+        """Returns the updates merged since the last call, and forgets them"""
+
+        with self.lock:
+            deltas = self.merged_deltas
+            self.merged_deltas = []
+        return deltas
+
+
+def get_spill_path(snapshot_path):
+
+    return os.path.splitext(snapshot_path)[0] + '.spill'
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(snapshot_path=persistence.TRAINING_FILE, journal_path=JOURNAL_FILE, max_states=None):
+
+    """Returns the model of the training data saved in these files. It is
+    loaded the first time, then every AI of the process gets the same one.
+    max_states: maximum number of states kept in memory (None: no limit). The
+    others are moved to a file next to the snapshot (see spill_store.py)"""
+
+    key = (os.path.abspath(snapshot_path), os.path.abspath(journal_path))
+    with _models_lock:
+        if key not in _models:
+            journal = get_journal(snapshot_path, journal_path)
+            # The memory budget applies while loading too
+            spill_store = None if max_states is None else Spill_store(get_spill_path(snapshot_path))
+            _models[key] = Value_model(journal.load(max_states, spill_store), journal)
+        model = _models[key]
+
+    if max_states is not None and model.store.max_states != max_states:
+        model.set_memory_budget(max_states, get_spill_path(snapshot_path))
+
+    return model
@@ -0,0 +1,145 @@
+"""An opening book for the AI: the move to play in every position of the
+beginning of a game, computed beforehand. The first moves of a game are the
+positions played the most often, so instead of looking up every candidate move
+in the training data, the AI finds its move with a single dictionary lookup.
+
+The book covers every position where fewer than --depth moves were played. The
+moves are picked either with the minimax player (see minimax_player.py), or
+from the training data of the AI (the best known move, as when it doesn't
+explore). Build it from this folder, for instance:
+
+    python opening_book.py --depth 4 --source minimax
+
+The book is stored in OPENING_BOOK_FILE: for each position, its key (see
+state_store.py, without symmetries so that no transformation is needed when
+the AI plays), the space to play and the canonical key of the resulting
+position, which the AI needs to learn from the game"""
+
+import os
+import argparse
+
+import numpy as np
+
+import persistence
+from model import get_model
+from state_store import encode_state
+from symmetry import canonical_key, candidate_keys
+from game_system import get_winning_lines
+from minimax_player import Minimax_player
+
+OPENING_BOOK_FILE = 'opening_book.npz'
+
+
+def get_positions(board_dimensions, depth, win_length):
+
+    """Returns every position where fewer than depth moves were played and the
+    game isn't over, as seen by the player about to play (1: this player, -1:
+    the opponent). The player may have played first or second"""
+
+    winning_lines = get_winning_lines(board_dimensions, win_length)
+    positions = [np.zeros(board_dimensions, dtype=np.int8)]
+    level = positions
+
+    for moves_nbr in range(1, depth):
+        next_level = {}
+        for board in level:
+            for space in np.flatnonzero(board.ravel() == 0).tolist():
+                # After the move, the opponent is about to play: the board is
+                # seen from the opponent's side
+                new_board = board.copy()
+                new_board.flat[space] = 1
+                if np.any(np.all(new_board.ravel()[winning_lines] == 1, axis=1)): continue
+                if np.all(new_board != 0): continue
+                new_board = -new_board
+                next_level[encode_state(new_board)] = new_board
+        level = list(next_level.values())
+        positions += level
+
+    return positions
+
+
+def get_best_move_from_table(model, board):
+
+    """Best known move in the training data, None if no move is known"""
+
+    _, spaces, keys = candidate_keys(board[None])
+    values = model.get_values(keys)
+    if np.all(np.isnan(values)): return None
+
+    return int(spaces[np.nanargmax(values)])
+
+
+def build_opening_book(board_dimensions, depth, win_length, source="minimax", time_budget=None):
+
+    """Returns the opening book as a dictionary: position key -> (space to
+    play, canonical key of the resulting position)"""
+
+    if source == "minimax": player = Minimax_player(win_length, time_budget=time_budget)
+    else: model = get_model()
+
+    opening_book = {}
+    for board in get_positions(board_dimensions, depth, win_length):
+
+        if source == "minimax":
+            space = int(np.flatnonzero(player.play(board).ravel() != board.ravel())[0])
+        else:
+            space = get_best_move_from_table(model, board)
+            if space is None: continue
+
+        new_board = board.copy()
+        new_board.flat[space] = 1
+        opening_book[encode_state(board)] = (space, canonical_key(new_board))
+
+    return opening_book
+
+
+def save_opening_book(opening_book, win_length, path=OPENING_BOOK_FILE):
+
+    keys = list(opening_book.keys())
+    key_width = max((len(k) for k in keys), default=0)
+    spaces = np.array([opening_book[k][0] for k in keys], dtype=np.uint16)
+    next_keys = [opening_book[k][1] for k in keys]
+
+    # Written in a temporary file first, like the training data
+    temporary_path = path + '.tmp.npz'
+    np.savez_compressed(temporary_path, win_length=win_length,
+                        keys=persistence.keys_to_array(keys, key_width), spaces=spaces,
+                        next_keys=persistence.keys_to_array(next_keys, key_width))
+    os.replace(temporary_path, path)
+
+
+def load_opening_book(win_length, path=OPENING_BOOK_FILE):
+
+    """Returns the opening book saved in path, or None if there is none for
+    this win_length"""
+
+    if not os.path.exists(path): return None
+
+    with np.load(path) as saved_data:
+        if int(saved_data["win_length"]) != win_length: return None
+        if len(saved_data["spaces"]) == 0: return {}
+
+        keys = persistence.array_to_keys(saved_data["keys"])
+        next_keys = persistence.array_to_keys(saved_data["next_keys"])
+        return dict(zip(keys, zip(saved_data["spaces"].tolist(), next_keys)))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Builds the opening book of the AI")
+    parser.add_argument("--board", type=int, nargs=2, default=[3, 3], metavar=("ROWS", "COLUMNS"),
+                        help="dimensions of the board")
+    parser.add_argument("--win-length", type=int, default=3, help="number of symbols to align to win")
+    parser.add_argument("--depth", type=int, default=4,
+                        help="the book covers the positions where fewer moves than this were played")
+    parser.add_argument("--source", choices=("minimax", "table"), default="minimax",
+                        help="how the moves are picked: minimax search, or the AI's training data")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="seconds of minimax search per position (by default, search until the end of the "
+                             "game: only for small boards)")
+    parser.add_argument("--output", default=OPENING_BOOK_FILE, help="file the book is written to")
+    args = parser.parse_args()
+
+    opening_book = build_opening_book(tuple(args.board), args.depth, args.win_length, args.source, args.time_budget)
+    save_opening_book(opening_book, args.win_length, args.output)
+    print(len(opening_book), "positions written to", args.output)
@@ -0,0 +1,260 @@
+"""Saves and loads the AI's training data.
+
+The training data is stored in a compact binary file: a short header followed
+by fixed-width records (state key, value, occurences). Loading the file maps
+it in memory and copies each column at once instead of parsing every state.
+The JSON layout used by earlier versions (training.json) can still be imported
+and exported, either from the AI or by running this script:
+
+    python persistence.py import training.json training.bin
+    python persistence.py export training.bin training.json
+"""
+
+import os
+import sys
+import json
+import struct
+
+import numpy as np
+
+from state_store import State_store, decode_state, key_size
+from symmetry import canonical_key
+
+TRAINING_FILE = 'training.bin'
+JSON_TRAINING_FILE = 'training.json'
+
+# Header: magic number, format version, key width (bytes), number of records,
+# journal generation (see journal.py: the snapshot includes every update
+# journaled in files of a lower generation)
+HEADER = struct.Struct('<4sHHQQ')
+MAGIC = b'TTTV'
+VERSION = 2
+
+# Number of records read or written at once when a file is streamed instead of
+# being loaded all at once (see load_training_data and merge_training_data)
+CHUNK_RECORDS = 65536
+
+
+def get_record_dtype(key_width):
+
+    return np.dtype([('key', np.uint8, (key_width,)),
+                     ('value', '<f8'),
+                     ('occurences', '<i8')])
+
+
+def keys_to_array(keys, key_width):
+
+    """Packs a list of keys into a (keys number, key_width) array. Keys shorter
+    than key_width (smaller boards) are padded with zeros"""
+
+    if all(len(k) == key_width for k in keys):
+        return np.frombuffer(b''.join(keys), dtype=np.uint8).reshape(len(keys), key_width)
+
+    array = np.zeros((len(keys), key_width), dtype=np.uint8)
+    for i, k in enumerate(keys):
+        array[i, :len(k)] = np.frombuffer(k, dtype=np.uint8)
+    return array
+
+
+def array_to_keys(array):
+
+    """Does the opposite of keys_to_array. The first two bytes of each key hold
+    the board's dimensions, which tell how much padding has to be removed"""
+
+    key_width = array.shape[1]
+    raw_keys = array.tobytes()
+    keys = [raw_keys[i:i+key_width] for i in range(0, len(raw_keys), key_width)]
+
+    return [k if key_size((k[0], k[1])) == key_width else k[:key_size((k[0], k[1]))] for k in keys]
+
+
+def save_training_data(store, path=TRAINING_FILE, generation=0):
+
+    """Writes the whole store in a binary file. The data is first written in a
+    temporary file which then replaces the old one, so that the file can't be
+    left half-written"""
+
+    keys, values, occurences = store.to_arrays()
+    key_width = max((len(k) for k in keys), default=0)
+
+    records = np.empty(len(keys), dtype=get_record_dtype(key_width))
+    records['key'] = keys_to_array(keys, key_width)
+    records['value'] = values
+    records['occurences'] = occurences
+
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as binary_file:
+        binary_file.write(HEADER.pack(MAGIC, VERSION, key_width, len(keys), generation))
+        records.tofile(binary_file)
+    os.replace(temporary_path, path)
+
+
+def read_header(path):
+
+    """Returns the key width, records number and journal generation of a
+    training data file"""
+
+    with open(path, 'rb') as binary_file:
+        header = binary_file.read(HEADER.size)
+
+    magic, version, key_width, records_nbr, generation = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(path + " is not a training data file this version can read")
+
+    return key_width, records_nbr, generation
+
+
+def load_training_data(path=TRAINING_FILE, max_states=None, spill_store=None):
+
+    """Loads a store previously written by save_training_data. If max_states
+    is set, the store gets that memory budget (see
+    State_store.set_memory_budget) before anything is loaded: only the
+    max_states states played the most are loaded in memory, the others are
+    streamed to spill_store (or ignored without one)"""
+
+    key_width, records_nbr, generation = read_header(path)
+
+    if records_nbr == 0:
+        store = State_store()
+        store.set_memory_budget(max_states, spill_store)
+        return store
+
+    records = np.memmap(path, dtype=get_record_dtype(key_width), mode='r',
+                        offset=HEADER.size, shape=(records_nbr,))
+
+    if max_states is None or records_nbr <= max_states:
+        store = State_store.from_arrays(array_to_keys(records['key']), records['value'], records['occurences'])
+        store.set_memory_budget(max_states, spill_store)
+
+    else:
+        kept = np.zeros(records_nbr, dtype=bool)
+        kept[np.argpartition(records['occurences'], records_nbr - max_states)[records_nbr - max_states:]] = True
+        kept_records = records[kept]
+        store = State_store.from_arrays(array_to_keys(kept_records['key']), kept_records['value'], kept_records['occurences'])
+        store.set_memory_budget(max_states, spill_store)
+
+        if spill_store is not None:
+            for start in range(0, records_nbr, CHUNK_RECORDS):
+                chunk = records[start:start+CHUNK_RECORDS][~kept[start:start+CHUNK_RECORDS]]
+                spill_store.write(array_to_keys(chunk['key']), chunk['value'], chunk['occurences'])
+
+    del records
+
+    return store
+
+
+def merge_training_data(deltas, path=TRAINING_FILE, generation=0):
+
+    """Adds updates to the training data saved in path (if any) without
+    loading it: the file is read and written again chunk by chunk, so only the
+    updates are held in memory. deltas: dictionary key -> [value, occurences],
+    where value is the sum of the results added to the state (see
+    State_store.add_result). The states found in the file are removed from
+    deltas. Like save_training_data, a temporary file replaces the old one"""
+
+    old_key_width, records_nbr = 0, 0
+    if os.path.exists(path): old_key_width, records_nbr, _ = read_header(path)
+    key_width = max([old_key_width] + [len(k) for k in deltas])
+    record_dtype = get_record_dtype(key_width)
+
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as binary_file:
+        # The number of records is only known at the end
+        binary_file.write(HEADER.pack(MAGIC, VERSION, key_width, 0, generation))
+
+        if records_nbr > 0:
+            records = np.memmap(path, dtype=get_record_dtype(old_key_width), mode='r',
+                                offset=HEADER.size, shape=(records_nbr,))
+
+            for start in range(0, records_nbr, CHUNK_RECORDS):
+                old_chunk = records[start:start+CHUNK_RECORDS]
+                chunk = np.zeros(len(old_chunk), dtype=record_dtype)
+                chunk['key'][:, :old_key_width] = old_chunk['key']
+                chunk['value'] = old_chunk['value']
+                chunk['occurences'] = old_chunk['occurences']
+
+                updated = [(i, deltas.pop(k)) for i, k in enumerate(array_to_keys(old_chunk['key'])) if k in deltas]
+                if updated:
+                    indexes = np.array([u[0] for u in updated])
+                    values = np.array([u[1][0] for u in updated], dtype=np.float64)
+                    occurences = np.array([u[1][1] for u in updated], dtype=np.int64)
+                    total = chunk['occurences'][indexes] + occurences
+                    chunk['value'][indexes] = (chunk['value'][indexes]*chunk['occurences'][indexes] + values) / total
+                    chunk['occurences'][indexes] = total
+
+                chunk.tofile(binary_file)
+
+            del records
+
+        # States that weren't in the file yet
+        keys = list(deltas.keys())
+        new_records = np.empty(len(keys), dtype=record_dtype)
+        new_records['key'] = keys_to_array(keys, key_width)
+        new_records['value'] = [deltas[k][0] / deltas[k][1] for k in keys]
+        new_records['occurences'] = [deltas[k][1] for k in keys]
+        new_records.tofile(binary_file)
+
+        binary_file.seek(0)
+        binary_file.write(HEADER.pack(MAGIC, VERSION, key_width, records_nbr + len(keys), generation))
+
+    os.replace(temporary_path, path)
+
+
+def import_json(path=JSON_TRAINING_FILE):
+
+    """Reads training data in the JSON layout. Equivalent states stored in
+    different orientations are merged under their canonical key"""
+
+    store = State_store()
+
+    with open(path, 'r', newline='') as json_file:
+
+        try:
+            json_data = json.load(json_file)
+
+        except json.decoder.JSONDecodeError:
+            return store
+
+    for state in json_data:
+
+        flat_array = np.array(state["array"], dtype=np.int8)
+        key = canonical_key(np.reshape(flat_array, state["dim"]))
+        store.add_result(key, state["value"]*state["occurences"], state["occurences"])
+
+    return store
+
+
+def export_json(store, path=JSON_TRAINING_FILE):
+
+    """Writes the training data in the JSON layout"""
+
+    json_global_list = []
+
+    for key, value, occurences in store.items():
+
+        state = decode_state(key)
+        json_global_list.append({"array": state.flatten().tolist(),
+                                 "dim": state.shape,
+                                 "value": float(value),
+                                 "occurences": int(occurences)})
+
+    with open(path, 'w', newline='') as json_file:
+        json.dump(json_global_list, json_file, indent=4)
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python persistence.py import|export SOURCE DESTINATION")
+        sys.exit(1)
+
+    if sys.argv[1] == "import":
+        save_training_data(import_json(sys.argv[2]), sys.argv[3])
+    elif not os.path.exists(sys.argv[2]):
+        print(sys.argv[2], "doesn't exist")
+        sys.exit(1)
+    else:
+        # The updates that are still in the journal are exported as well
+        from journal import Journal, JOURNAL_FILE
+        journal_path = os.path.join(os.path.dirname(sys.argv[2]), JOURNAL_FILE)
+        export_json(Journal(sys.argv[2], journal_path).load(), sys.argv[3])
@@ -0,0 +1,24 @@
+"""Inherits from Player_interface. A player picking a random empty space,
+used as a fixed opponent to assess the AIs"""
+
+import random
+
+import numpy as np
+
+from interfaces import Player_interface
+
+class Random_player(Player_interface):
+
+    def __init__(self):
+
+        self.is_AI = True
+
+    def play(self, current_state):
+
+        new_state = current_state.copy()
+        new_state.flat[random.choice(np.flatnonzero(current_state.ravel() == 0).tolist())] = 1
+        return new_state
+
+    def notify_game_result(self, result):
+
+        return
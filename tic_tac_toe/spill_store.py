@@ -0,0 +1,58 @@
+"""Second tier of the training data, on disk. When the number of states kept in
+memory is limited (see State_store.set_memory_budget), the states evicted from
+memory are moved here, and moved back to memory the next time they are used.
+
+This file is only scratch space: the training data itself is still saved in
+training.bin and the journal (see journal.py), which include every state
+whether it is in memory or not. It is created again each time the program
+starts. The states are stored in an SQLite table so that finding one doesn't
+need any index in memory"""
+
+import os
+import sqlite3
+
+SPILL_FILE = 'training.spill'
+
+
+class Spill_store:
+
+    def __init__(self, path=SPILL_FILE):
+
+        self.path = path
+        if os.path.exists(path): os.remove(path)
+
+        # The data doesn't need to survive a crash, so nothing is synced to disk
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = OFF")
+        self.connection.execute("PRAGMA synchronous = OFF")
+        self.connection.execute("CREATE TABLE states (key BLOB PRIMARY KEY, value REAL, occurences INTEGER) WITHOUT ROWID")
+
+    def __len__(self):
+
+        return self.connection.execute("SELECT COUNT(*) FROM states").fetchone()[0]
+
+    def __contains__(self, key):
+
+        return self.connection.execute("SELECT 1 FROM states WHERE key = ?", (key,)).fetchone() is not None
+
+    def write(self, keys, values, occurences):
+
+        """Adds states evicted from memory (keys, values and occurences arrays)"""
+
+        self.connection.executemany("INSERT OR REPLACE INTO states VALUES (?, ?, ?)",
+                                    zip(keys, values.tolist(), occurences.tolist()))
+
+    def pop(self, key):
+
+        """Removes a state and returns its (value, occurences), or None if it
+        isn't there"""
+
+        record = self.connection.execute("SELECT value, occurences FROM states WHERE key = ?", (key,)).fetchone()
+        if record is not None: self.connection.execute("DELETE FROM states WHERE key = ?", (key,))
+
+        return record
+
+    def close(self):
+
+        self.connection.close()
+        if os.path.exists(self.path): os.remove(self.path)
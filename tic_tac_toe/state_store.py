@@ -0,0 +1,284 @@
+"""The AI's value table. Each known state of the board is stored under a
+compact key so that finding, adding or updating a state doesn't depend on the
+number of states already known"""
+
+import numpy as np
+
+# A board is encoded as a sequence of base-3 digits (one per space: 0 for -1,
+# 1 for an empty space and 2 for 1). Five digits fit in a single byte
+# (3^5 = 243), so a 3x3 board only needs 2 bytes
+DIGITS_PER_BYTE = 5
+PACKING_WEIGHTS = np.array([81, 27, 9, 3, 1], dtype=np.uint8)
+
+# Part of the states evicted at once when the memory budget of a State_store is
+# reached (see State_store.evict)
+EVICTION_FRACTION = 0.1
+
+
+def pack_states(flat_boards):
+
+    """Packs the base-3 digits of flattened boards 5 by 5. Works on any array
+    whose last dimension is the flattened board, and returns an array of bytes
+    with the same leading dimensions"""
+
+    digits = (flat_boards + 1).astype(np.uint8)
+    padding = -digits.shape[-1] % DIGITS_PER_BYTE
+    if padding:
+        digits = np.concatenate((digits, np.zeros(digits.shape[:-1] + (padding,), dtype=np.uint8)), axis=-1)
+    digits = digits.reshape(digits.shape[:-1] + (-1, DIGITS_PER_BYTE))
+
+    return (digits @ PACKING_WEIGHTS).astype(np.uint8)
+
+
+def encode_state(board):
+
+    """Turns a board (numpy array of -1, 0 and 1) into a hashable key. The
+    first two bytes of the key hold the board's dimensions, so that boards with
+    different shapes can't share a key"""
+
+    return bytes(board.shape) + pack_states(board.ravel()).tobytes()
+
+
+def encode_states(boards):
+
+    """Same as encode_state, for an array of boards sharing the same shape
+    (first dimension: board number). Returns a list of keys"""
+
+    packed = pack_states(boards.reshape(boards.shape[0], -1))
+    prefix = bytes(boards.shape[1:])
+
+    return [prefix + row.tobytes() for row in packed]
+
+
+def key_size(shape):
+
+    """Number of bytes in the key of a board with that shape"""
+
+    return 2 + -(-shape[0]*shape[1] // DIGITS_PER_BYTE)
+
+
+def decode_state(key):
+
+    """Does the opposite of encode_state: rebuilds the board from its key"""
+
+    shape = (key[0], key[1])
+    packed = np.frombuffer(key[2:], dtype=np.uint8)
+    digits = (packed[:, None] // PACKING_WEIGHTS) % 3
+    flat_board = digits.ravel()[:shape[0]*shape[1]].astype(np.int8) - 1
+
+    return np.reshape(flat_board, shape)
+
+
+class State_store:
+
+    """Maps the key of each known state to its value and to the number of
+    times it was played. A dictionary gives the position (slot) of each state
+    in the values and occurences arrays, so every lookup, insertion or update
+    takes constant time.
+
+    The number of states kept in memory can be limited with set_memory_budget.
+    How often each state is used is then tracked in the frequencies array, to
+    decide which states to evict (see evict)"""
+
+    def __init__(self, capacity=1024):
+
+        self.index = {}
+        self.keys = []
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.occurences = np.zeros(capacity, dtype=np.int64)
+        self.frequencies = np.zeros(capacity, dtype=np.float32)
+
+        # No limit by default
+        self.max_states = None
+        self.spill_store = None
+
+    @classmethod
+    def from_arrays(cls, keys, values, occurences):
+
+        """Builds a store from a list of keys and the matching values and
+        occurences arrays (used when loading the training data from a file)"""
+
+        store = cls(max(len(keys), 1024))
+        store.keys = list(keys)
+        store.index = dict(zip(store.keys, range(len(store.keys))))
+        store.values[:len(keys)] = values
+        store.occurences[:len(keys)] = occurences
+        store.frequencies[:len(keys)] = occurences
+        return store
+
+    def to_arrays(self):
+
+        """Returns the keys, values and occurences of all the states in memory"""
+
+        states_nbr = len(self.keys)
+        return self.keys, self.values[:states_nbr], self.occurences[:states_nbr]
+
+    def __len__(self):
+
+        """Number of states in memory"""
+
+        return len(self.keys)
+
+    def __contains__(self, key):
+
+        if key in self.index: return True
+        return self.spill_store is not None and key in self.spill_store
+
+    def get(self, key):
+
+        """Returns a (value, occurences) tuple, or None if the state is unknown"""
+
+        slot = self.find_slot(key)
+        if slot is None: return None
+
+        self.frequencies[slot] += 1
+        return (self.values[slot], self.occurences[slot])
+
+    def get_value(self, key, default=None):
+
+        slot = self.find_slot(key)
+        if slot is None: return default
+
+        self.frequencies[slot] += 1
+        return self.values[slot]
+
+    def get_values(self, keys):
+
+        """Returns an array with the value of each key, NaN for unknown states"""
+
+        slots = np.fromiter((self.index.get(k, -1) for k in keys), dtype=np.int64, count=len(keys))
+        values = self.values[slots]
+        values[slots < 0] = np.nan
+        self.frequencies[slots[slots >= 0]] += 1
+
+        # The states missing from memory may have been evicted to the disk.
+        # Bringing them back can evict other states, so it is done last
+        if self.spill_store is not None:
+            for i in np.flatnonzero(slots < 0).tolist():
+                record = self.spill_store.pop(keys[i])
+                if record is not None:
+                    values[i] = record[0]
+                    self.restore(keys[i], *record)
+
+        return values
+
+    def set(self, key, value, occurences):
+
+        """Overwrites the value and occurences of a state, adding it if needed"""
+
+        slot = self.index.get(key)
+        if slot is None:
+            if self.spill_store is not None: self.spill_store.pop(key)
+            slot = self.add_slot(key)
+
+        self.values[slot] = value
+        self.occurences[slot] = occurences
+        self.frequencies[slot] += 1
+
+    def add_result(self, key, value, occurences=1):
+
+        """Adds the result of one or several games to the running average kept
+        for that state"""
+
+        slot = self.find_slot(key)
+        if slot is None:
+            slot = self.add_slot(key)
+            self.values[slot] = value / occurences
+            self.occurences[slot] = occurences
+            self.frequencies[slot] = occurences
+            return
+
+        total = self.occurences[slot] + occurences
+        self.values[slot] = (self.values[slot]*self.occurences[slot] + value) / total
+        self.occurences[slot] = total
+        self.frequencies[slot] += occurences
+
+    def find_slot(self, key):
+
+        """Returns the slot of a state, bringing it back to memory if it was
+        evicted to the disk. None if the state is unknown"""
+
+        slot = self.index.get(key)
+        if slot is not None or self.spill_store is None: return slot
+
+        record = self.spill_store.pop(key)
+        if record is None: return None
+
+        return self.restore(key, *record)
+
+    def restore(self, key, value, occurences):
+
+        """Adds a state brought back from the disk. It counts as just used once"""
+
+        slot = self.add_slot(key)
+        self.values[slot] = value
+        self.occurences[slot] = occurences
+        self.frequencies[slot] = 1
+        return slot
+
+    def set_memory_budget(self, max_states, spill_store=None):
+
+        """Limits the number of states kept in memory to max_states (None: no
+        limit). Once it is reached, the least used states are evicted (see
+        evict) to make room for new ones. If a Spill_store is given (see
+        spill_store.py), the evicted states are moved there, otherwise they are
+        forgotten"""
+
+        self.max_states = max_states
+        self.spill_store = spill_store
+        if max_states is not None and len(self.keys) > max_states: self.evict(len(self.keys) - max_states)
+
+    def evict(self, states_nbr):
+
+        """Evicts the states_nbr least frequently used states from memory (LFU
+        with aging). Every lookup or update of a state adds to its frequency,
+        and all the frequencies are halved after each eviction, so that states
+        used a lot a long time ago don't stay in memory forever"""
+
+        total_states_nbr = len(self.keys)
+        states_nbr = min(states_nbr, total_states_nbr)
+        if states_nbr == 0: return
+
+        evicted = np.argpartition(self.frequencies[:total_states_nbr], states_nbr-1)[:states_nbr]
+        if self.spill_store is not None:
+            self.spill_store.write([self.keys[s] for s in evicted.tolist()], self.values[evicted], self.occurences[evicted])
+
+        kept = np.ones(total_states_nbr, dtype=bool)
+        kept[evicted] = False
+        kept = np.flatnonzero(kept)
+        kept_nbr = len(kept)
+
+        self.keys = [self.keys[s] for s in kept.tolist()]
+        self.index = dict(zip(self.keys, range(kept_nbr)))
+        self.values[:kept_nbr] = self.values[kept]
+        self.occurences[:kept_nbr] = self.occurences[kept]
+        self.frequencies[:kept_nbr] = self.frequencies[kept] / 2
+
+    def items(self):
+
+        """Iterates over (key, value, occurences) for every state in memory"""
+
+        for slot, key in enumerate(self.keys):
+            yield key, self.values[slot], self.occurences[slot]
+
+    def add_slot(self, key):
+
+        """Adds a state to memory and returns its slot. If memory is full,
+        EVICTION_FRACTION of the states are evicted first, so that evictions
+        remain rare"""
+
+        if self.max_states is not None and len(self.keys) >= self.max_states:
+            self.evict(max(1, int(self.max_states * EVICTION_FRACTION)))
+
+        slot = len(self.keys)
+        if slot == self.values.size:
+            # The arrays are doubled whenever they are full so that adding a
+            # state remains constant time on average
+            self.values = np.concatenate((self.values, np.zeros_like(self.values)))
+            self.occurences = np.concatenate((self.occurences, np.zeros_like(self.occurences)))
+            self.frequencies = np.concatenate((self.frequencies, np.zeros_like(self.frequencies)))
+
+        self.keys.append(key)
+        self.index[key] = slot
+        self.frequencies[slot] = 0
+        return slot
@@ -0,0 +1,202 @@
+"""Rotating or mirroring a tic-tac-toe board doesn't change the game: the best
+move on the mirrored board is the mirror of the best move. The AI uses this to
+store a single canonical version of all the boards that are equivalent by
+symmetry, which makes its training data up to 8 times smaller and lets it learn
+from a game for every equivalent orientation at once"""
+
+import numpy as np
+
+from state_store import pack_states, DIGITS_PER_BYTE, PACKING_WEIGHTS
+
+# A square board has 8 symmetries (4 rotations, each of them can be mirrored)
+SQUARE_SYMMETRIES = [lambda a: a,
+                     lambda a: np.rot90(a, 1),
+                     lambda a: np.rot90(a, 2),
+                     lambda a: np.rot90(a, 3),
+                     lambda a: np.fliplr(a),
+                     lambda a: np.flipud(a),
+                     lambda a: a.T,
+                     lambda a: np.rot90(a, 2).T]
+
+# Rotating a rectangular board by a quarter turn changes its shape, so only
+# the half turn and the two mirrors remain
+RECTANGLE_SYMMETRIES = [lambda a: a,
+                        lambda a: np.rot90(a, 2),
+                        lambda a: np.fliplr(a),
+                        lambda a: np.flipud(a)]
+
+_permutations_cache = {}
+_inverse_permutations_cache = {}
+
+
+def get_permutations(shape):
+
+    """Returns an array with one row per symmetry of a board with that shape.
+    Each row is a permutation of the spaces' indexes: board.ravel()[row] is the
+    transformed board, flattened"""
+
+    if shape not in _permutations_cache:
+
+        indexes = np.arange(shape[0]*shape[1]).reshape(shape)
+        if shape[0] == shape[1]: symmetries = SQUARE_SYMMETRIES
+        else: symmetries = RECTANGLE_SYMMETRIES
+        _permutations_cache[shape] = np.array([s(indexes).ravel() for s in symmetries])
+
+    return _permutations_cache[shape]
+
+
+def select_smallest(packed_boards):
+
+    """packed_boards: array of packed boards (see pack_states) with one row per
+    symmetry for each board (shape: boards number, symmetries number, bytes).
+    Returns the smallest row of each board, comparing rows byte by byte like
+    the keys themselves are compared"""
+
+    boards_nbr, symmetries_nbr, bytes_nbr = packed_boards.shape
+
+    # The rows are compared 8 bytes at a time, as big-endian integers (a 3x3
+    # board fits in a single one). A packed byte is never 255, so rows that
+    # are already known not to be the smallest can be set to the maximum
+    padding = -bytes_nbr % 8
+    chunks = np.concatenate((packed_boards, np.zeros((boards_nbr, symmetries_nbr, padding), dtype=np.uint8)), axis=2)
+    chunks = np.ascontiguousarray(chunks).view('>u8')
+
+    candidates = np.ones((boards_nbr, symmetries_nbr), dtype=bool)
+    for chunk in range(chunks.shape[2]):
+        chunk_values = np.where(candidates, chunks[:, :, chunk], np.iinfo(np.uint64).max)
+        candidates &= chunk_values == chunk_values.min(axis=1, keepdims=True)
+
+    return packed_boards[np.arange(boards_nbr), candidates.argmax(axis=1)]
+
+
+def canonical_key(board):
+
+    """Returns the key shared by all the boards equivalent to this one. The
+    canonical orientation is simply the one with the smallest key"""
+
+    return canonical_keys(board[None])[0]
+
+
+def canonical_keys(boards):
+
+    """Same as canonical_key for an array of boards sharing the same shape
+    (first dimension: board number). Returns a list of keys"""
+
+    shape = boards.shape[1:]
+    transformed_boards = boards.reshape(len(boards), -1)[:, get_permutations(shape)]
+    prefix = bytes(shape)
+
+    return [prefix + row.tobytes() for row in select_smallest(pack_states(transformed_boards))]
+
+
+def get_inverse_permutations(shape):
+
+    """Returns, for every symmetry, where each space of the board ends up in
+    the transformed board"""
+
+    if shape not in _inverse_permutations_cache:
+        _inverse_permutations_cache[shape] = np.argsort(get_permutations(shape), axis=1)
+
+    return _inverse_permutations_cache[shape]
+
+
+def candidate_keys(boards, player_value=1):
+
+    """Returns the canonical key of every board obtained by playing
+    player_value on one of the empty spaces of boards (array of boards sharing
+    the same shape, first dimension: board number), without building these
+    boards: each transformed board is packed once, then only the byte holding
+    the played space is changed for each candidate.
+    Return value: (board numbers, spaces, keys), one item per candidate"""
+
+    shape = boards.shape[1:]
+    flat_boards = boards.reshape(len(boards), -1)
+    permutations = get_permutations(shape)
+
+    board_numbers, spaces = np.nonzero(flat_boards == 0)
+    candidates = pack_states(flat_boards[:, permutations])[board_numbers]
+    play_on_packed_boards(candidates, get_inverse_permutations(shape)[:, spaces].T, player_value)
+
+    prefix = bytes(shape)
+    keys = [prefix + row.tobytes() for row in select_smallest(candidates)]
+
+    return board_numbers, spaces, keys
+
+
+def play_on_packed_boards(packed_boards, positions, player_value):
+
+    """Plays player_value on one space of packed boards (shape: boards number,
+    symmetries number, bytes), in place. positions: where the space played is
+    in each transformed board (shape: boards number, symmetries number).
+    Playing on an empty space changes its digit from 1 to 1 + player_value, so
+    only the byte holding it changes"""
+
+    boards_nbr, symmetries_nbr = positions.shape
+    digit_changes = PACKING_WEIGHTS[positions % DIGITS_PER_BYTE].astype(np.int16) * player_value
+    changed_bytes = (np.arange(boards_nbr)[:, None], np.arange(symmetries_nbr)[None, :], positions // DIGITS_PER_BYTE)
+    packed_boards[changed_bytes] = (packed_boards[changed_bytes] + digit_changes).astype(np.uint8)
+
+
+class Position:
+
+    """A board kept as the list of the moves played on it, (space, player
+    value), instead of an array. Like a Zobrist hash, the packed version of
+    every orientation of the board is updated move by move: a move only changes
+    one byte per orientation. The canonical key of the position, and of every
+    position one move away, is then computed without building any board"""
+
+    def __init__(self, shape):
+
+        self.shape = tuple(shape)
+        self.moves = []
+        self.occupied_spaces = np.zeros(shape[0]*shape[1], dtype=bool)
+
+        # positions[s]: where the space s is in every transformed board
+        self.positions = get_inverse_permutations(self.shape).T
+        self.packed_boards = pack_states(np.zeros((1, len(self.positions[0]), shape[0]*shape[1]), dtype=np.int8))
+
+    def play(self, space, player_value):
+
+        play_on_packed_boards(self.packed_boards, self.positions[space][None], player_value)
+        self.occupied_spaces[space] = True
+        self.moves.append((space, player_value))
+
+    def follows(self, board):
+
+        """Returns True if board can be reached from the position, i.e. it has
+        the same shape and every space played in the position is played on it"""
+
+        return board.shape == self.shape and bool(np.all(board.ravel()[self.occupied_spaces] != 0))
+
+    def catch_up(self, board):
+
+        """Plays the moves found on board that aren't in the position yet (e.g.
+        those of the opponent). board must follow the position"""
+
+        flat_board = board.ravel()
+        for space in np.flatnonzero((flat_board != 0) & ~self.occupied_spaces).tolist():
+            self.play(space, int(flat_board[space]))
+
+    def key(self):
+
+        return bytes(self.shape) + select_smallest(self.packed_boards)[0].tobytes()
+
+    def candidate_keys(self, player_value=1):
+
+        """Same as candidate_keys, for the position.
+        Return value: (spaces, keys), one item per empty space"""
+
+        spaces = np.flatnonzero(~self.occupied_spaces)
+        candidates = np.repeat(self.packed_boards, len(spaces), axis=0)
+        play_on_packed_boards(candidates, self.positions[spaces], player_value)
+
+        prefix = bytes(self.shape)
+        return spaces, [prefix + row.tobytes() for row in select_smallest(candidates)]
+
+    def to_board(self):
+
+        """Builds the board of the position"""
+
+        flat_board = np.zeros(len(self.occupied_spaces), dtype=np.int8)
+        for space, player_value in self.moves: flat_board[space] = player_value
+        return flat_board.reshape(self.shape)
@@ -0,0 +1,171 @@
+"""Inherits from Player_interface. Another learning AI, using temporal
+difference learning, TD(lambda), instead of the end-of-game averages of ai.py.
+
+The AI still learns the value of the board after each of its moves (how likely
+it is to win from there), but it updates these values during the game: after
+every move, the value of the previous boards is moved towards the value of the
+new one. Eligibility traces spread each update to all the boards played before
+in the game, less and less the further back they are (trace_decay is the
+lambda of TD(lambda)). At the end of the game, the boards are moved towards the
+actual result. Results propagate to earlier boards during the game instead of
+only at its end. compare_learning.py doesn't show it learning faster than
+ai.py, though: about as fast on a 3x3 board, slower on a 4x4 board.
+
+Values are stored in a dense array with one entry per possible board: the index
+of a board is its base-3 number (one digit per space: 0 for -1, 1 for an empty
+space, 2 for 1), 3^9 entries for a 3x3 board. Like in ai.py, the smallest index
+among the symmetric versions of a board is used. Only small boards fit (see
+MAX_SPACES).
+
+Instead of a fixed exploration rate, the probability of playing a random move
+starts at initial_exploration and decays after every game down to
+final_exploration. No value is updated through a random move, since it
+doesn't tell anything about the value of the boards played before.
+
+Run compare_learning.py to compare how fast both AIs learn"""
+
+import os
+import random
+
+import numpy as np
+
+from interfaces import Player_interface
+from symmetry import get_permutations, get_inverse_permutations
+
+TD_VALUES_FILE = 'td_values.npz'
+
+# 3^16 values take 344 MB: larger boards don't fit in a dense array
+MAX_SPACES = 16
+
+
+def new_values(board_dimensions):
+
+    """Returns the values of an AI that hasn't learnt anything yet: every board
+    is worth as much as a draw"""
+
+    return np.full(3**(board_dimensions[0]*board_dimensions[1]), 0.5)
+
+
+class TD_AI(Player_interface):
+
+    def __init__(self, board_dimensions=(3,3), values=None, persistent=True, learning_rate=0.2,
+                 trace_decay=0.8, initial_exploration=0.3, final_exploration=0.01,
+                 exploration_decay=0.999, save_interval=100):
+
+        """values: array of values to share with another TD_AI (e.g. for
+        self-play). If None, the values are loaded from TD_VALUES_FILE"""
+
+        self.is_AI = True
+
+        spaces_nbr = board_dimensions[0]*board_dimensions[1]
+        if spaces_nbr > MAX_SPACES:
+            raise ValueError("Boards with more than " + str(MAX_SPACES) + " spaces are too large for TD_AI")
+
+        self.board_dimensions = tuple(board_dimensions)
+        self.powers = 3 ** np.arange(spaces_nbr, dtype=np.int64)
+        self.permutations = get_permutations(self.board_dimensions)
+        self.inverse_permutations = get_inverse_permutations(self.board_dimensions)
+
+        self.learning_rate = learning_rate
+        self.trace_decay = trace_decay
+        self.initial_exploration = initial_exploration
+        self.final_exploration = final_exploration
+        self.exploration_decay = exploration_decay
+        # If learning is False, the AI neither explores nor updates its values
+        self.learning = True
+
+        self.persistent = persistent
+        self.save_interval = save_interval
+        self.games_played = 0
+        if values is None: values = self.load_values()
+        self.values = values
+
+        # Boards played in the current game (indexes in values) and their
+        # eligibility traces
+        self.trace_indexes = []
+        self.traces = np.zeros(0)
+
+    def play(self, current_state):
+
+        """current_state: numpy array showing the current state of the board
+        return value: numpy array of the board including the move the AI picked"""
+
+        spaces, indexes = self.get_candidate_indexes(current_state)
+
+        if self.learning and random.uniform(0, 1) < self.get_exploration_rate():
+            choice = random.randint(0, len(spaces)-1)
+            # Nothing is learnt through a random move
+            self.trace_indexes = []
+            self.traces = np.zeros(0)
+        else:
+            candidate_values = self.values[indexes]
+            best_choices = np.flatnonzero(candidate_values == candidate_values.max())
+            choice = random.choice(best_choices.tolist())
+            if self.learning: self.learn(self.values[indexes[choice]])
+
+        if self.learning:
+            self.trace_indexes.append(indexes[choice])
+            self.traces = np.append(self.traces, 1.0)
+
+        new_state = current_state.copy()
+        new_state.flat[spaces[choice]] = 1
+        return new_state
+
+    def notify_game_result(self, result):
+
+        if not self.learning: return
+
+        self.learn(result)
+        self.trace_indexes = []
+        self.traces = np.zeros(0)
+
+        self.games_played += 1
+        if self.persistent and self.games_played % self.save_interval == 0: self.save_values()
+
+    def learn(self, target):
+
+        """TD update: moves the value of the last board played towards target (the
+        value of the new board, or the result of the game), and the boards
+        played before it proportionally to their eligibility trace"""
+
+        if not self.trace_indexes: return
+
+        indexes = np.array(self.trace_indexes)
+        error = target - self.values[indexes[-1]]
+        self.values[indexes] += self.learning_rate * error * self.traces
+        self.traces *= self.trace_decay
+
+    def get_exploration_rate(self):
+
+        return max(self.final_exploration, self.initial_exploration * self.exploration_decay**self.games_played)
+
+    def get_candidate_indexes(self, current_state):
+
+        """Returns the empty spaces and the index of the board resulting from
+        playing on each of them. The index of the current board is computed for
+        every symmetry once, then playing on a space adds 3^(its position in the
+        transformed board) since its digit goes from 1 to 2"""
+
+        flat_state = current_state.ravel().astype(np.int64)
+        spaces = np.flatnonzero(flat_state == 0)
+
+        symmetric_indexes = (flat_state[self.permutations] + 1) @ self.powers
+        candidate_indexes = symmetric_indexes[None, :] + self.powers[self.inverse_permutations[:, spaces].T]
+
+        return spaces, candidate_indexes.min(axis=1)
+
+    def load_values(self):
+
+        if os.path.exists(TD_VALUES_FILE):
+            with np.load(TD_VALUES_FILE) as saved_data:
+                if saved_data["values"].size == 3**len(self.powers):
+                    self.games_played = int(saved_data["games_played"])
+                    return saved_data["values"]
+
+        return new_values(self.board_dimensions)
+
+    def save_values(self):
+
+        temporary_path = TD_VALUES_FILE + '.tmp.npz'
+        np.savez(temporary_path, values=self.values, games_played=self.games_played)
+        os.replace(temporary_path, TD_VALUES_FILE)
@@ -0,0 +1,132 @@
+"""Trains the AI without any display by having it play against itself on
+several processes at once. Launch it from this folder, for instance:
+
+    python train.py --games 100000 --workers 8
+
+Training is done in rounds. At the start of a round, every worker receives the
+current training data and plays its share of the round's games, learning from
+them as it goes. At the end of the round, the updates made by all the workers
+are merged into the shared training data, which is then saved (see journal.py).
+The --sync-interval option sets how many games each worker plays per round,
+and --batch-size how many of them it plays at the same time"""
+
+import os
+import time
+import random
+import argparse
+import multiprocessing
+
+import numpy as np
+
+import persistence
+from ai import AI
+from batch_game_system import Batch_game_system
+from journal import get_journal
+from model import Value_model
+from spill_store import Spill_store
+
+# The training data is sent to the workers through this file at the start of
+# each round
+ROUND_FILE = 'training.round.bin'
+
+
+def play_games(games_nbr, board_dimensions, win_length, batch_size, max_states=None, round_file=ROUND_FILE):
+
+    """Runs in a worker process. Plays games_nbr games between two AIs sharing
+    the training data of the current round, batch_size games at a time (see
+    batch_game_system.py), and returns the updates they made as (keys, values,
+    occurences). If max_states is set, the states the workers have to evict
+    are simply forgotten: the updates they made are kept anyway"""
+
+    # Workers are forked from the same process, so they would all play the same
+    # games if the random generators weren't seeded again
+    random.seed()
+    np.random.seed()
+
+    training_data = persistence.load_training_data(round_file, max_states)
+    model = Value_model(training_data, keep_deltas=True)
+    player_1 = AI(model)
+    player_2 = AI(model)
+    game_system = Batch_game_system(player_1, player_2, batch_size, win_length)
+
+    deltas = {}
+    for first_game in range(0, games_nbr, batch_size):
+        game_system.play_games(min(batch_size, games_nbr - first_game), board_dimensions)
+        for key, value, occurences in model.take_merged_deltas():
+            delta = deltas.setdefault(key, [0, 0])
+            delta[0] += value
+            delta[1] += occurences
+
+    keys = list(deltas.keys())
+    values = np.array([deltas[k][0] for k in keys], dtype=np.float64)
+    occurences = np.array([deltas[k][1] for k in keys], dtype=np.int64)
+    return keys, values, occurences
+
+
+def train(games_nbr, workers_nbr, sync_interval, board_dimensions=(3,3), win_length=3, batch_size=100,
+          max_states=None):
+
+    # Only the states used the most are kept in memory (and sent to the
+    # workers), the others are moved to the disk, even while loading
+    journal = get_journal()
+    training_data = journal.load(max_states, None if max_states is None else Spill_store())
+    print("Training data loaded:", len(training_data), "states in memory")
+
+    games_played = 0
+    starting_time = time.time()
+
+    with multiprocessing.Pool(workers_nbr) as pool:
+
+        while games_played < games_nbr:
+
+            round_starting_time = time.time()
+            round_games = min(games_nbr - games_played, workers_nbr*sync_interval)
+            # The games of the round are spread as evenly as possible
+            shares = [round_games//workers_nbr + (i < round_games % workers_nbr) for i in range(workers_nbr)]
+            shares = [s for s in shares if s > 0]
+
+            persistence.save_training_data(training_data, ROUND_FILE)
+            results = pool.starmap(play_games, [(s, board_dimensions, win_length, batch_size, max_states) for s in shares])
+
+            # Merging the updates made by every worker. They are also journaled so
+            # that they are saved
+            deltas = []
+            for keys, values, occurences in results:
+                for key, value, occurence in zip(keys, values.tolist(), occurences.tolist()):
+                    training_data.add_result(key, value, occurence)
+                    deltas.append((key, value, occurence))
+            journal.append(deltas)
+
+            games_played += round_games
+            round_duration = time.time() - round_starting_time
+            print("Games played:", games_played, "/", games_nbr,
+                  "-", round(round_games / round_duration), "games/s",
+                  "- states in memory:", len(training_data))
+
+    journal.close()
+    os.remove(ROUND_FILE)
+    if training_data.spill_store is not None: training_data.spill_store.close()
+
+    total_duration = time.time() - starting_time
+    print("Played", games_played, "games in", round(total_duration, 1), "s:",
+          round(games_played / total_duration), "games/s")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Trains the AI by self-play on several processes")
+    parser.add_argument("--games", type=int, default=10000, help="number of games to play")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--sync-interval", type=int, default=500,
+                        help="number of games each worker plays before the training data is merged")
+    parser.add_argument("--board", type=int, nargs=2, default=[3, 3], metavar=("ROWS", "COLUMNS"),
+                        help="dimensions of the board")
+    parser.add_argument("--win-length", type=int, default=3, help="number of symbols to align to win")
+    parser.add_argument("--batch-size", type=int, default=100,
+                        help="number of games each worker plays at the same time")
+    parser.add_argument("--max-states", type=int, default=None,
+                        help="maximum number of states kept in memory (by default, no limit)")
+    args = parser.parse_args()
+
+    train(args.games, args.workers, args.sync_interval, tuple(args.board), args.win_length, args.batch_size,
+          args.max_states)